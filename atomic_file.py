@@ -0,0 +1,21 @@
+# write files so a concurrent reader never sees half a file
+# the content is written to a temporary file next to the target, which then
+# replaces the target in one rename
+
+import contextlib
+import os
+
+
+# open path for writing through a temporary file, renamed onto path once the
+# block finishes. If the block raises, path is left untouched
+# mode: "w" or "wb"
+@contextlib.contextmanager
+def atomic_write(path, mode="wb"):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, mode) as file:
+            yield file
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,335 @@
+# benchmarks for the physics simulation and trace analysis hot paths
+# every benchmark runs on synthetic constellations and traces, so none of them
+# need ns-3
+#
+# usage: python3 benchmark.py [--entities 6 50 200] [--timesteps 1 1000]
+#                             [--trace-lines 10000 100000] [--only get_stats ...]
+#                             [--save] [--compare] [--baseline <file>]
+# --save stores the results as the baseline, --compare prints each result
+# against the baseline and exits with 1 if any got more than
+# REGRESSION_THRESHOLD times slower
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import physics_simulation as sim
+import process_data
+import trace_generator
+
+ENTITY_COUNTS = [6, 50, 200, 500, 1000, 2000]
+TIMESTEP_COUNTS = [1, 100, 10000, 100000]
+TRACE_LINES = [10000, 100000, 1000000]
+
+# the pure python reference is O(n^3), do not run it past this many entities
+SCALAR_MAX_ENTITIES = 200
+
+# the dense vectorized check is still O(n^3)
+DENSE_MAX_ENTITIES = 1000
+
+# get_stats and get_connections build a python dict per pair of entities
+STATS_MAX_ENTITIES = 1000
+
+# bands of the link_budget benchmark: Ka and X-band, with and without dishes
+BENCH_PROFILES = [
+    sim.DEFAULT_PROFILE,
+    {"name": "X", "frequency": 8.4e9, "tx_gain": 0.0, "rx_gain": 0.0},
+    {"name": "Ka dish", "frequency": 3.2e10, "tx_gain": 60.0, "rx_gain": 70.0},
+]
+
+# entities of the constellation the timestep benchmarks run on
+TIMESTEP_ENTITIES = 50
+
+BASELINE_PATH = "data/benchmark_baseline.json"
+
+# a result this many times slower than its baseline is a regression
+REGRESSION_THRESHOLD = 1.25
+
+# results faster than this are too noisy to call a regression (s)
+REGRESSION_MIN_TIME = 0.01
+
+# runs shorter than this are repeated, keeping the best
+REPEAT_BELOW = 1.0
+
+
+# build a synthetic constellation of n entities: the bodies from initial_pos
+# plus small satellites orbiting Earth (id 1) and Mars (id 2)
+def synthetic_constellation(n, seed=0):
+    rng = random.Random(seed)
+    entities = [dict(entity) for entity in sim.initial_pos[:n]]
+
+    for e_id in range(len(entities), n):
+        orb_id = rng.choice([1, 2])
+        parent_radius = sim.initial_pos[orb_id]["radius"]
+        entities.append(
+            {
+                "id": e_id,
+                "name": f"Relay {e_id}",
+                "orbital_radius": parent_radius + rng.uniform(300000, 40000000),
+                "orb_id": orb_id,
+                "period": rng.uniform(5000, 200000),
+                "radius": 10,
+                "can_connect": True,
+                "orbital_direction": rng.choice([1, -1]),
+            }
+        )
+
+    return entities
+
+
+# returns coordinates, radii and can_connect arrays for the constellation at t
+def constellation_arrays(entities, t=1e6):
+    xy = sim.get_positions([t], entities)[0]
+    radius = np.array([entity["radius"] for entity in entities], dtype=np.float64)
+    can_connect = np.array([entity["can_connect"] for entity in entities], dtype=bool)
+    return xy, radius, can_connect
+
+
+# write a trace of roughly the given number of lines with trace_generator,
+# packets go from Earth to Mars directly or through the Sun
+def synthetic_trace(path, lines, seed=0):
+    paths = [[1, 2], [1, 0, 2]]
+
+    # every hop is 3 lines, and packets make 1.5 hops on average
+    packets = max(1, int(lines / 4.5))
+    trace_generator.generate_trace(path, packets, paths=paths, drop_rate=0.01, seed=seed)
+
+
+# the original triple loop over point_dist_to_line, kept as a reference
+def scalar_line_of_sight(xy, radius, can_connect):
+    n = len(xy)
+    connected = np.zeros((n, n), dtype=bool)
+
+    for s in range(n):
+        for r in range(n):
+            if s == r or not (can_connect[s] and can_connect[r]):
+                continue
+            blocking = False
+            for b in range(n):
+                if b != s and b != r:
+                    dist = sim.point_dist_to_line(
+                        xy[s][0], xy[s][1], xy[r][0], xy[r][1], xy[b][0], xy[b][1]
+                    )
+                    if dist < radius[b]:
+                        blocking = True
+            connected[s][r] = not blocking
+
+    return connected
+
+
+# time a function, returning the best of repeat runs in seconds
+# setup: called before every run, untimed
+def best_time(func, *args, repeat=3, setup=None):
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# time a function, repeating it if it is quick enough
+def time_call(func, *args, setup=None):
+    first = best_time(func, *args, repeat=1, setup=setup)
+    if first < REPEAT_BELOW:
+        return min(first, best_time(func, *args, repeat=2, setup=setup))
+    return first
+
+
+# run a function with the entities of the simulation set to entities, so
+# functions of physics_simulation.py that use initial_pos run on them
+def with_entities(entities, func, *args):
+    saved = list(sim.initial_pos)
+    sim.set_entities(entities)
+    try:
+        return func(*args)
+    finally:
+        sim.set_entities(saved)
+
+
+# one point against the segment between every pair of entities
+def point_dist_to_line_pairs(xy):
+    for s in range(len(xy)):
+        for r in range(len(xy)):
+            sim.point_dist_to_line(xy[s][0], xy[s][1], xy[r][0], xy[r][1], 0.0, 0.0)
+
+
+# benchmarks over the number of entities
+# each returns the time of one run for a constellation of n entities
+def bench_entities(name, n):
+    entities = synthetic_constellation(n)
+    xy, radius, can_connect = constellation_arrays(entities)
+
+    if name == "point_dist_to_line":
+        return time_call(point_dist_to_line_pairs, xy)
+    if name == "scalar_line_of_sight":
+        return time_call(scalar_line_of_sight, xy, radius, can_connect)
+    if name == "line_of_sight_dense":
+        return time_call(sim.line_of_sight_dense, xy, radius, can_connect)
+    if name == "line_of_sight_culled":
+        return time_call(sim.line_of_sight_culled, xy, radius, can_connect)
+    if name == "get_stats":
+        return with_entities(entities, time_call, sim.get_stats, 1e6, True)
+    if name == "get_connections":
+        registry = sim.get_registry(entities)
+        return time_call(lambda: sim.get_connections(registry.stats_view(xy), True))
+    if name == "link_budget":
+        distance = sim.distance_matrix(xy)
+        return time_call(sim.link_budget, distance, BENCH_PROFILES, True, np.float32)
+
+
+# benchmarks over the number of timesteps, on TIMESTEP_ENTITIES entities
+def bench_timesteps(name, steps):
+    entities = synthetic_constellation(TIMESTEP_ENTITIES)
+    times = np.linspace(0, 3.2e7, steps)
+
+    if name == "get_positions":
+        return time_call(sim.get_positions, times, entities)
+
+
+# benchmarks over the number of lines of a synthetic trace
+def bench_trace(name, lines):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "synthetic.tr")
+        synthetic_trace(path, lines)
+
+        if name == "process_trace":
+            return time_call(process_data.process_trace, path)
+        if name == "create_stats_df":
+            # from the trace every time, not from the columns cached next to it
+            def clear_cache():
+                shutil.rmtree(process_data.trace_cache_dir(path), ignore_errors=True)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                return time_call(process_data.create_stats_df, path, setup=clear_cache)
+
+
+# name -> (function, size parameter, largest size it runs at)
+BENCHMARKS = {
+    "point_dist_to_line": (bench_entities, "entities", STATS_MAX_ENTITIES),
+    "scalar_line_of_sight": (bench_entities, "entities", SCALAR_MAX_ENTITIES),
+    "line_of_sight_dense": (bench_entities, "entities", DENSE_MAX_ENTITIES),
+    "line_of_sight_culled": (bench_entities, "entities", None),
+    "get_stats": (bench_entities, "entities", STATS_MAX_ENTITIES),
+    "get_connections": (bench_entities, "entities", STATS_MAX_ENTITIES),
+    "link_budget": (bench_entities, "entities", None),
+    "get_positions": (bench_timesteps, "timesteps", None),
+    "process_trace": (bench_trace, "trace_lines", None),
+    "create_stats_df": (bench_trace, "trace_lines", None),
+}
+
+
+# run the benchmarks, printing each result as it comes
+# sizes: {size parameter: list of sizes}
+# returns {benchmark: {size: seconds}}
+def run_benchmarks(names, sizes, baseline=None):
+    results = {}
+
+    print(f"{'benchmark':<22} {'size':>10} {'time (s)':>12} {'baseline (s)':>13} {'ratio':>7}")
+    for name in names:
+        function, parameter, largest = BENCHMARKS[name]
+        results[name] = {}
+
+        for size in sizes[parameter]:
+            if largest is not None and size > largest:
+                continue
+            seconds = function(name, size)
+            results[name][str(size)] = seconds
+
+            before = (baseline or {}).get(name, {}).get(str(size))
+            if before:
+                print(f"{name:<22} {size:>10} {seconds:12.4f} {before:13.4f} {seconds / before:7.2f}")
+            else:
+                print(f"{name:<22} {size:>10} {seconds:12.4f} {'-':>13} {'-':>7}")
+
+    return results
+
+
+# results slower than their baseline by more than REGRESSION_THRESHOLD, as a
+# list of (benchmark, size, ratio)
+def regressions(results, baseline):
+    slower = []
+    for name, timings in results.items():
+        for size, seconds in timings.items():
+            before = baseline.get(name, {}).get(size)
+            if (
+                before
+                and max(seconds, before) > REGRESSION_MIN_TIME
+                and seconds / before > REGRESSION_THRESHOLD
+            ):
+                slower.append((name, size, seconds / before))
+    return slower
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as file:
+        return json.load(file)["results"]
+
+
+# merge the results into the baseline file, keeping the results of
+# benchmarks and sizes that were not run
+def save_baseline(results, path):
+    baseline = load_baseline(path) or {}
+    for name, timings in results.items():
+        baseline.setdefault(name, {}).update(timings)
+
+    with open(path, "w") as file:
+        json.dump(
+            {
+                "machine": platform.machine(),
+                "processor": platform.processor(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "results": baseline,
+            },
+            file,
+            indent=2,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the simulation hot paths")
+    parser.add_argument("--entities", nargs="+", type=int, default=ENTITY_COUNTS)
+    parser.add_argument("--timesteps", nargs="+", type=int, default=TIMESTEP_COUNTS)
+    parser.add_argument("--trace-lines", nargs="+", type=int, default=TRACE_LINES)
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    args = parser.parse_args()
+
+    sizes = {
+        "entities": args.entities,
+        "timesteps": args.timesteps,
+        "trace_lines": args.trace_lines,
+    }
+    baseline = load_baseline(args.baseline) if args.compare else None
+    results = run_benchmarks(args.only, sizes, baseline)
+
+    if args.save:
+        save_baseline(results, args.baseline)
+
+    if baseline is not None:
+        slower = regressions(results, baseline)
+        for name, size, ratio in slower:
+            print(f"regression: {name} at {size} is {ratio:.2f}x slower than the baseline")
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
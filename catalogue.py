@@ -0,0 +1,347 @@
+# load the entities of the simulation from a catalogue file, and generate
+# constellations of relays
+# a catalogue is a json list of entities (or {"entities": [...]}), or a csv
+# file with one entity per row and the fields of physics_simulation.py's
+# initial_pos as columns. Catalogues are validated when they are loaded.
+# The network indexes entities by position, so ids must run from 0 to n - 1
+# in catalogue order.
+# Catalogues of thousands of entities load and give positions quickly, but
+# line of sight is quadratic in the number of entities, see the README.
+#
+# usage: python3 catalogue.py check <catalogue>
+#        validates a catalogue and prints a summary of it
+#        python3 catalogue.py walker <output> --parent 1 --count 24
+#                            --radius 7000000 --period 5800 [--planes 1]
+#                            [--phasing 0] [--spacing 0] [--base <catalogue>]
+#        writes the base catalogue (initial_pos by default) plus a walker
+#        style constellation around the parent
+
+import argparse
+import csv
+import json
+
+import physics_simulation as sim
+
+# field -> type of every entity field, see initial_pos
+FIELDS = {
+    "id": int,
+    "name": str,
+    "orbital_radius": float,
+    "orb_id": int,
+    "period": float,
+    "radius": float,
+    "can_connect": bool,
+    "orbital_direction": int,
+}
+
+# fields which may be left out, with their default
+OPTIONAL_FIELDS = {"phase": 0.0}
+
+# values of can_connect accepted in csv catalogues
+TRUE_VALUES = {"true", "1", "yes"}
+FALSE_VALUES = {"false", "0", "no"}
+
+# errors reported before giving up on a catalogue
+MAX_ERRORS = 20
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"not a boolean: {value!r}")
+
+
+# convert a value to the type of its field
+def parse_field(field, value):
+    kind = {**FIELDS, **{name: type(default) for name, default in OPTIONAL_FIELDS.items()}}[field]
+    if kind is bool:
+        return parse_bool(value)
+    if kind is int:
+        number = float(value)
+        if number != int(number):
+            raise ValueError(f"not an integer: {value!r}")
+        return int(number)
+    return kind(value)
+
+
+# check a list of entities and convert every field to its type
+# returns new entity dicts holding exactly the known fields, in the order of
+# FIELDS, with the optional fields only if they are set
+# raises ValueError listing the problems found, up to MAX_ERRORS
+def validate_entities(entities):
+    errors = []
+    validated = []
+    rows = []
+    complete = True
+
+    for row, entity in enumerate(entities):
+        if len(errors) >= MAX_ERRORS:
+            complete = False
+            break
+        if not isinstance(entity, dict):
+            errors.append(f"entity {row}: not an object but {type(entity).__name__}")
+            complete = False
+            continue
+        label = f"entity {row} ({entity.get('name', '?')})"
+        checked = {}
+        for field in FIELDS:
+            if field not in entity or entity[field] in ("", None):
+                errors.append(f"{label}: missing {field}")
+                continue
+            try:
+                checked[field] = parse_field(field, entity[field])
+            except (TypeError, ValueError) as e:
+                errors.append(f"{label}: bad {field}, {e}")
+        for field, default in OPTIONAL_FIELDS.items():
+            if entity.get(field) not in ("", None):
+                try:
+                    value = parse_field(field, entity[field])
+                except (TypeError, ValueError) as e:
+                    errors.append(f"{label}: bad {field}, {e}")
+                    continue
+                if value != default:
+                    checked[field] = value
+        unknown = set(entity) - set(FIELDS) - set(OPTIONAL_FIELDS)
+        if unknown:
+            errors.append(f"{label}: unknown fields {sorted(unknown)}")
+        if len(checked) < len(FIELDS):
+            complete = False
+            continue
+
+        if checked["period"] <= 0:
+            errors.append(f"{label}: period must be positive")
+        if checked["radius"] < 0 or checked["orbital_radius"] < 0:
+            errors.append(f"{label}: radii can not be negative")
+        if checked["orbital_direction"] not in (1, -1):
+            errors.append(f"{label}: orbital_direction must be 1 or -1")
+        validated.append(checked)
+        rows.append(row)
+
+    # the rows that validated are checked even if others did not, so that
+    # all the errors show up at once
+    errors.extend(check_hierarchy(validated, None if complete else rows))
+
+    if errors:
+        raise ValueError("invalid catalogue:\n" + "\n".join(errors[:MAX_ERRORS]))
+    return validated
+
+
+# errors in how the entities relate to each other
+# rows: catalogue row of each entity, if some rows of the catalogue are
+#       missing because they failed validation. The checks that need every
+#       entity, like whether a parent exists, are skipped then
+def check_hierarchy(entities, rows=None):
+    errors = []
+    by_id = {}
+    names = set()
+    complete = rows is None
+    if complete:
+        rows = range(len(entities))
+
+    # network_sim.py and the link arrays index entities by position
+    misplaced = [(row, e) for row, e in zip(rows, entities) if e["id"] != row]
+    if misplaced:
+        index, entity = misplaced[0]
+        errors.append(
+            f"{entity['name']} has id {entity['id']} at position {index}, ids must "
+            f"count up from 0 in catalogue order"
+        )
+
+    for entity in entities:
+        if entity["id"] in by_id:
+            errors.append(f"duplicate id {entity['id']}")
+        by_id[entity["id"]] = entity
+        # the network maps names to routers
+        if entity["name"] in names:
+            errors.append(f"duplicate name {entity['name']}")
+        names.add(entity["name"])
+
+    for entity in entities:
+        parent = by_id.get(entity["orb_id"])
+        if entity["orb_id"] != -1 and parent is None:
+            if complete:
+                errors.append(f"{entity['name']} orbits unknown entity {entity['orb_id']}")
+        elif parent is not None and entity["orbital_radius"] <= parent["radius"]:
+            # line of sight treats an entity inside another as always blocked
+            errors.append(f"{entity['name']} orbits inside {parent['name']}")
+
+    if complete and not errors:
+        try:
+            sim.resolve_orbit_order(entities)
+        except ValueError as e:
+            errors.append(str(e))
+
+    return errors
+
+
+def read_catalogue(path):
+    if path.endswith(".csv"):
+        with open(path, "r", newline="") as file:
+            return list(csv.DictReader(file))
+
+    with open(path, "r") as file:
+        data = json.load(file)
+    return data["entities"] if isinstance(data, dict) else data
+
+
+# load and validate a catalogue file
+def load_catalogue(path):
+    return validate_entities(read_catalogue(path))
+
+
+def save_catalogue(entities, path):
+    if path.endswith(".csv"):
+        fields = list(FIELDS) + [
+            field for field in OPTIONAL_FIELDS if any(field in entity for entity in entities)
+        ]
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=fields, restval="")
+            writer.writeheader()
+            writer.writerows(entities)
+    else:
+        with open(path, "w") as file:
+            json.dump(entities, file, indent=2)
+
+
+# load a catalogue and make it the entities of the simulation
+def use_catalogue(path):
+    entities = load_catalogue(path)
+    sim.set_entities(entities)
+    return entities
+
+
+# count satellites evenly phased on one circular orbit around parent_id
+# first_id: id of the first satellite, the others follow
+# phase: angle of the first satellite at time 0 (degrees)
+def walker_ring(
+    parent_id,
+    count,
+    orbital_radius,
+    period,
+    first_id,
+    name="Relay",
+    phase=0.0,
+    radius=10,
+    can_connect=True,
+    orbital_direction=1,
+):
+    ring = []
+    for k in range(count):
+        entity = {
+            "id": first_id + k,
+            "name": f"{name} {first_id + k}",
+            "orbital_radius": orbital_radius,
+            "orb_id": parent_id,
+            "period": period,
+            "radius": radius,
+            "can_connect": can_connect,
+            "orbital_direction": orbital_direction,
+        }
+        angle = (phase + 360.0 * k / count) % 360.0
+        if angle:
+            entity["phase"] = angle
+        ring.append(entity)
+    return ring
+
+
+# a walker style constellation of total satellites around parent_id, split
+# evenly over planes rings. In 2d the rings are coplanar, so they are spaced
+# apart by spacing (m) instead of inclined. Like the phasing factor F of a
+# walker delta T/P/F constellation, ring p is rotated by
+# 360 * phasing * p / total degrees
+# period: period of the innermost ring, the others follow kepler's third law
+def walker_constellation(
+    parent_id,
+    total,
+    orbital_radius,
+    period,
+    first_id,
+    planes=1,
+    phasing=0,
+    spacing=0.0,
+    name="Relay",
+    **kwargs,
+):
+    if total % planes != 0:
+        raise ValueError("total must be a multiple of planes")
+    per_plane = total // planes
+
+    constellation = []
+    for p in range(planes):
+        ring_radius = orbital_radius + p * spacing
+        constellation += walker_ring(
+            parent_id,
+            per_plane,
+            ring_radius,
+            period * (ring_radius / orbital_radius) ** 1.5,
+            first_id + p * per_plane,
+            name,
+            phase=360.0 * phasing * p / total,
+            **kwargs,
+        )
+    return constellation
+
+
+# number of entities orbiting each entity
+def summarize(entities):
+    names = {entity["id"]: entity["name"] for entity in entities}
+    orbiting = {}
+    for entity in entities:
+        orbiting[entity["orb_id"]] = orbiting.get(entity["orb_id"], 0) + 1
+
+    print(f"{len(entities)} entities, {sum(e['can_connect'] for e in entities)} can connect")
+    for orb_id, count in sorted(orbiting.items()):
+        print(f"  {count} orbiting {names.get(orb_id, 'nothing')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and generate entity catalogues")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    check = commands.add_parser("check")
+    check.add_argument("catalogue")
+
+    walker = commands.add_parser("walker")
+    walker.add_argument("output")
+    walker.add_argument("--parent", type=int, required=True)
+    walker.add_argument("--count", type=int, required=True)
+    walker.add_argument("--radius", type=float, required=True)
+    walker.add_argument("--period", type=float, required=True)
+    walker.add_argument("--planes", type=int, default=1)
+    walker.add_argument("--phasing", type=int, default=0)
+    walker.add_argument("--spacing", type=float, default=0.0)
+    walker.add_argument("--name", default="Relay")
+    walker.add_argument("--base", default=None)
+    args = parser.parse_args()
+
+    if args.command == "check":
+        summarize(load_catalogue(args.catalogue))
+        return
+
+    base = load_catalogue(args.base) if args.base else validate_entities(sim.initial_pos)
+    first_id = max(entity["id"] for entity in base) + 1
+    entities = validate_entities(
+        base
+        + walker_constellation(
+            args.parent,
+            args.count,
+            args.radius,
+            args.period,
+            first_id,
+            args.planes,
+            args.phasing,
+            args.spacing,
+            args.name,
+        )
+    )
+    save_catalogue(entities, args.output)
+    summarize(entities)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+# generate a contact plan: the windows during which each pair of entities
+# has line of sight, found from the orbits in physics_simulation.py instead of
+# sampling the topology once per network time step
+#
+# usage: python3 contact_plan.py <start (s)> <end (s)> <output>
+# an output ending in .csv gets the full interval table, anything else gets an
+# ION style contact plan
+
+import sys
+
+import numpy as np
+
+import physics_simulation as sim
+
+# the coarse scan samples the shortest orbit this many times per period,
+# any occlusion shorter than one sample may be missed
+SAMPLES_PER_ORBIT = 64
+
+# window edges are refined until they are known to within this many seconds
+TIME_TOLERANCE = 1e-3
+
+# number of samples averaged for the mean delay and error rate of a window
+WINDOW_SAMPLES = 16
+
+# number of elements of the (samples, pairs, entities) temporaries of
+# links_clear evaluated at once, bounds memory on long plans
+CHUNK_ELEMENTS = 2**21
+
+# data rate of the links between routers in network_sim.py (bytes/s)
+DATA_RATE = 125000
+
+
+# default spacing (s) of the coarse scan for a list of entities
+def default_resolution(entities):
+    periods = [entity["period"] for entity in entities if entity["orb_id"] != -1]
+    return min(periods) / SAMPLES_PER_ORBIT
+
+
+# number of samples to evaluate at once when every sample holds width
+# elements per pair, e.g. width=len(entities) for links_clear
+def chunk_samples(pairs, width):
+    return max(1, CHUNK_ELEMENTS // max(1, pairs * width))
+
+
+# every pair of entities that can connect, as two index arrays with s < r
+# occlusion is symmetric, so each pair is only checked in one direction
+def connectable_pairs(entities):
+    ids = [i for i, entity in enumerate(entities) if entity["can_connect"]]
+    pairs = [(s, r) for k, s in enumerate(ids) for r in ids[k + 1 :]]
+    s = np.array([pair[0] for pair in pairs], dtype=np.intp)
+    r = np.array([pair[1] for pair in pairs], dtype=np.intp)
+    return s, r
+
+
+# check if the links between s and r are clear of every other entity
+# xy: positions of shape (k, n, 2), as returned by get_positions
+# s, r: indices of shape (k, p) or broadcastable to it
+# radius: array of shape (n,) with the radius of every entity (m)
+# returns a (k, p) bool array, the same test as physics_simulation.line_of_sight
+def links_clear(xy, s, r, radius):
+    k = np.arange(len(xy))[:, None]
+    s, r = np.broadcast_arrays(s, r)
+    s = np.broadcast_to(s, (len(xy), s.shape[-1]))
+    r = np.broadcast_to(r, (len(xy), r.shape[-1]))
+
+    # segment from s to r, shape (k, p)
+    c = xy[k, r, 0] - xy[k, s, 0]
+    d = xy[k, r, 1] - xy[k, s, 1]
+    len_sq = c * c + d * d
+
+    # vector from s to every blocker, shape (k, p, n)
+    a = xy[:, None, :, 0] - xy[k, s, 0][:, :, None]
+    b = xy[:, None, :, 1] - xy[k, s, 1][:, :, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        param = (a * c[:, :, None] + b * d[:, :, None]) / len_sq[:, :, None]
+    param[np.broadcast_to(len_sq[:, :, None] == 0, param.shape)] = 0
+    np.clip(param, 0, 1, out=param)
+
+    dx = a - param * c[:, :, None]
+    dy = b - param * d[:, :, None]
+    blocking = dx * dx + dy * dy < radius**2
+
+    # an entity can not block a link it is part of
+    blockers = np.arange(xy.shape[1])
+    blocking &= blockers != s[:, :, None]
+    blocking &= blockers != r[:, :, None]
+
+    return ~blocking.any(axis=2)
+
+
+# find every time a link changes state between start and end
+# returns the state of every pair at start, and a list of transitions
+# (time, pair index, state after the transition), sorted by time.
+# the coarse scan finds the sample interval containing a transition, which is
+# then narrowed down by bisection to TIME_TOLERANCE
+def find_transitions(start, end, entities=None, resolution=None):
+    if entities is None:
+        entities = sim.initial_pos
+    if resolution is None:
+        resolution = default_resolution(entities)
+
+    radius = np.array([entity["radius"] for entity in entities], dtype=np.float64)
+    s, r = connectable_pairs(entities)
+
+    samples = max(2, int(np.ceil((end - start) / resolution)) + 1)
+    times = np.linspace(start, end, samples)
+    step = chunk_samples(len(s), len(entities))
+
+    brackets = []
+    initial = None
+    for begin in range(0, samples - 1, step):
+        # chunks share their last sample so no interval is skipped
+        chunk = times[begin : begin + step + 1]
+        state = links_clear(sim.get_positions(chunk, entities), s, r, radius)
+        if initial is None:
+            initial = state[0]
+
+        change_t, change_p = np.nonzero(state[1:] != state[:-1])
+        for t_i, p in zip(change_t, change_p):
+            brackets.append((chunk[t_i], chunk[t_i + 1], p, state[t_i, p]))
+
+    if not brackets:
+        return initial, []
+
+    lo = np.array([bracket[0] for bracket in brackets])
+    hi = np.array([bracket[1] for bracket in brackets])
+    p = np.array([bracket[2] for bracket in brackets], dtype=np.intp)
+    before = np.array([bracket[3] for bracket in brackets], dtype=bool)
+
+    # bisect the brackets of a chunk at once, every bracket is one sample of
+    # one pair
+    step = chunk_samples(1, len(entities))
+    for begin in range(0, len(brackets), step):
+        part = slice(begin, begin + step)
+        while np.max(hi[part] - lo[part]) > TIME_TOLERANCE:
+            mid = (lo[part] + hi[part]) / 2
+            xy = sim.get_positions(mid, entities)
+            state = links_clear(xy, s[p[part]][:, None], r[p[part]][:, None], radius)[:, 0]
+            unchanged = state == before[part]
+            lo[part] = np.where(unchanged, mid, lo[part])
+            hi[part] = np.where(unchanged, hi[part], mid)
+
+    transitions = sorted(
+        zip(((lo + hi) / 2).tolist(), p.tolist(), (~before).tolist())
+    )
+    return initial, transitions
+
+
+# times between start and end at which the topology should be updated: start,
+# just after every link transition, and whenever the one way light time of a
+# link that is up has drifted by more than max_delay_drift (s) since the last
+# update. The drift is only checked on the coarse scan, so it can exceed
+# max_delay_drift by the drift of one sample. max_delay_drift=None only
+# updates on transitions.
+# returns a sorted array of times (s)
+def update_schedule(start, end, max_delay_drift=None, entities=None, resolution=None):
+    if entities is None:
+        entities = sim.initial_pos
+    if resolution is None:
+        resolution = default_resolution(entities)
+
+    radius = np.array([entity["radius"] for entity in entities], dtype=np.float64)
+    s, r = connectable_pairs(entities)
+    _, transitions = find_transitions(start, end, entities, resolution)
+
+    # bisection leaves the transition within TIME_TOLERANCE, update after it
+    changes = {time + TIME_TOLERANCE for time, _, _ in transitions}
+    changes = {time for time in changes if time < end}
+    if max_delay_drift is None:
+        return np.array(sorted(changes | {start}), dtype=np.float64)
+
+    samples = max(2, int(np.ceil((end - start) / resolution)) + 1)
+    times = np.union1d(np.linspace(start, end, samples)[:-1], list(changes))
+
+    updates = []
+    reference = None
+    previous = None
+    step = chunk_samples(len(s), len(entities))
+    for begin in range(0, len(times), step):
+        chunk = times[begin : begin + step]
+        xy = sim.get_positions(chunk, entities)
+        up = links_clear(xy, s, r, radius)
+        delta = xy[:, r] - xy[:, s]
+        delay = sim.transmission_time(np.sqrt(delta[:, :, 0] ** 2 + delta[:, :, 1] ** 2))
+
+        for k, time in enumerate(chunk):
+            if reference is None or time in changes:
+                updates.append(time)
+                reference = delay[k]
+            elif np.any(np.abs(delay[k] - reference)[up[k]] > max_delay_drift):
+                # update at the last sample still within the drift, unless
+                # that was an update already
+                if previous[0] != updates[-1]:
+                    updates.append(previous[0])
+                    reference = previous[1]
+                if np.any(np.abs(delay[k] - reference)[up[k]] > max_delay_drift):
+                    updates.append(time)
+                    reference = delay[k]
+            previous = (time, delay[k])
+
+    return np.array(updates, dtype=np.float64)
+
+
+# build the contact plan for every pair of entities between start and end
+# returns a list of windows, one per direction, each a dict with:
+# "src", "dst": entity ids
+# "src_name", "dst_name": english names of the entities
+# "start", "end": times the window opens and closes (s)
+# "delay": mean one way light time over the window (s)
+# "error_rate": mean error rate over the window
+def contact_plan(start, end, entities=None, resolution=None, high_error=True):
+    if entities is None:
+        entities = sim.initial_pos
+
+    s, r = connectable_pairs(entities)
+    initial, transitions = find_transitions(start, end, entities, resolution)
+
+    # turn the transitions into open windows per pair
+    windows = []
+    opened = [start if up else None for up in initial]
+    for time, p, up in transitions:
+        if up:
+            opened[p] = time
+        elif opened[p] is not None:
+            windows.append((p, opened[p], time))
+            opened[p] = None
+    for p, time in enumerate(opened):
+        if time is not None:
+            windows.append((p, time, end))
+
+    if not windows:
+        return []
+
+    # average the link metrics over a few samples inside every window
+    p = np.array([window[0] for window in windows], dtype=np.intp)
+    w_start = np.array([window[1] for window in windows])
+    w_end = np.array([window[2] for window in windows])
+    fraction = np.linspace(0, 1, WINDOW_SAMPLES)
+    times = w_start[:, None] + (w_end - w_start)[:, None] * fraction[None, :]
+
+    delay = np.empty(len(windows))
+    error_rate = np.empty(len(windows))
+    step = chunk_samples(WINDOW_SAMPLES, 2 * len(entities))
+    for begin in range(0, len(windows), step):
+        part = slice(begin, begin + step)
+        xy = sim.get_positions(times[part].ravel(), entities).reshape(
+            -1, WINDOW_SAMPLES, len(entities), 2
+        )
+        rows = np.arange(len(xy))
+        delta = xy[rows, :, r[p[part]]] - xy[rows, :, s[p[part]]]
+        distance = np.sqrt(delta[:, :, 0] ** 2 + delta[:, :, 1] ** 2)
+        delay[part] = sim.transmission_time(distance).mean(axis=1)
+        error_rate[part] = sim.error_rate_from_distance(distance, high_error).mean(axis=1)
+
+    plan = []
+    for k in np.argsort(w_start, kind="stable"):
+        for src, dst in ((s[p[k]], r[p[k]]), (r[p[k]], s[p[k]])):
+            plan.append(
+                {
+                    "src": entities[src]["id"],
+                    "dst": entities[dst]["id"],
+                    "src_name": entities[src]["name"],
+                    "dst_name": entities[dst]["name"],
+                    "start": float(w_start[k]),
+                    "end": float(w_end[k]),
+                    "delay": float(delay[k]),
+                    "error_rate": float(error_rate[k]),
+                }
+            )
+
+    return plan
+
+
+# write the plan as an interval table
+def write_contact_table(plan, path):
+    with open(path, "w") as file:
+        file.write("src,dst,src_name,dst_name,start,end,delay,error_rate\n")
+        for window in plan:
+            file.write(
+                f"{window['src']},{window['dst']},{window['src_name']},"
+                f"{window['dst_name']},{window['start']:.3f},{window['end']:.3f},"
+                f"{window['delay']:.6f},{window['error_rate']:.6e}\n"
+            )
+
+
+# write the plan in the format of an ION contact plan, with times relative to
+# the start of the plan. Every window becomes a contact at DATA_RATE and a
+# range with its mean one way light time. ION has no notion of error rate, it
+# is kept as a comment after each contact
+def write_contact_plan(plan, path, start=0):
+    with open(path, "w") as file:
+        file.write(f"# contact plan from t = {start} s\n")
+        for window in plan:
+            begin = window["start"] - start
+            end = window["end"] - start
+            file.write(
+                f"a contact +{begin:.3f} +{end:.3f} {window['src']} {window['dst']} "
+                f"{DATA_RATE} # error rate {window['error_rate']:.6e}\n"
+            )
+            file.write(
+                f"a range +{begin:.3f} +{end:.3f} {window['src']} {window['dst']} "
+                f"{window['delay']:.3f}\n"
+            )
+
+
+def main():
+    if len(sys.argv) < 4:
+        print("usage: python3 contact_plan.py <start> <end> <output>")
+        sys.exit(1)
+
+    start = float(sys.argv[1])
+    end = float(sys.argv[2])
+    plan = contact_plan(start, end)
+
+    if sys.argv[3].endswith(".csv"):
+        write_contact_table(plan, sys.argv[3])
+    else:
+        write_contact_plan(plan, sys.argv[3], start)
+
+
+if __name__ == "__main__":
+    main()
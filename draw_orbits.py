@@ -1,10 +1,26 @@
 # file to draw the orbits, to visually test physics_simulation.py
+#
+# usage: python3 draw_orbits.py
+#        shows the animation in a window
+#        python3 draw_orbits.py <output.gif|output.mp4> [--daily] [--frames 500]
+#                               [--workers N]
+#        renders the animation, or one frame per day for a year with --daily,
+#        without a display. Frames are drawn on a pool of processes and
+#        encoded with Pillow (gif) or ffmpeg (mp4)
+
+import argparse
+import itertools
+import multiprocessing
+import shutil
+import subprocess
 
 import physics_simulation as sim
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation  
-import json
+import matplotlib.animation as animation
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import numpy as np
+from PIL import Image
 
 # radius of solar system (m)
 SOLAR_SYSTEM_RAD = 258000000000
@@ -14,75 +30,195 @@ SECONDS_IN_DAY = 86400
 # over 1 year in seconds
 MAX_T = 31536000
 
-fig, ax = plt.subplots()
+# frames of the animation, 2 days per frame
+ANIMATION_FRAMES = 500
+ANIMATION_STEP = 2 * SECONDS_IN_DAY
 
-ax.set_xlim([-258000000000, 258000000000])
-ax.set_ylim([-258000000000, 258000000000]) 
+COLORS = ["r", "b", "g", "c", "m", "y"]
 
-scatter = ax.scatter([], [])
+# rendered frames are FRAME_SIZE x FRAME_SIZE pixels
+FRAME_SIZE = 480
+FRAME_DPI = 100
+FPS = 30
 
-# called for frame i
-def animate(i):
-    # t is a parameter which varies with the frame number 
-    # 2 days per frame
-    t =  2 * SECONDS_IN_DAY * i  
+# number of frames drawn by a worker per task
+FRAMES_PER_TASK = 16
+
+# figure of the current render worker, set by init_renderer
+RENDERER = None
 
-    # slow down timer to see moon orbit earth
-    # t = 360 * i
 
-    x_data = []
-    y_data = []
-    
-    # grab the data from physics_simulation.py
-    data = sim.get_stats(t)
-    
-    for datum in data:       
-        # appending values to the previously  
-        # empty x and y data holders  
-        x_data.append(datum["x"])  
-        y_data.append(datum["y"])
+# times of the animation frames
+def animation_times(frames=ANIMATION_FRAMES):
+    # slow down timer to see moon orbit earth
+    # return 360 * np.arange(frames)
+    return ANIMATION_STEP * np.arange(frames)
 
-    # uncomment to see moon orbit earth
-    # ax.set_xlim([data[1]["x"] - EARTH_ORBIT_RAD, data[1]["x"] + EARTH_ORBIT_RAD])
-    # ax.set_ylim([data[1]["y"] - EARTH_ORBIT_RAD, data[1]["y"] + EARTH_ORBIT_RAD]) 
 
-    # add it to animation
-    scatter.set_offsets(np.column_stack((x_data, y_data)))  
-    return scatter,
+# times of the daily frames, for a year
+def daily_times():
+    return np.arange(0, MAX_T, SECONDS_IN_DAY)
 
 
 # bootstrap for animated python file
-def animated():
-    anim = animation.FuncAnimation(fig, animate, frames = 500, interval = 20, blit = True)
-    plt.show()
+def animated(frames=ANIMATION_FRAMES):
+    fig, ax = plt.subplots()
 
-    # writergif = animation.PillowWriter(fps=30) 
-    # anim.save("data/orbit_earth.gif", writer=writergif)
+    ax.set_xlim([-SOLAR_SYSTEM_RAD, SOLAR_SYSTEM_RAD])
+    ax.set_ylim([-SOLAR_SYSTEM_RAD, SOLAR_SYSTEM_RAD])
 
+    scatter = ax.scatter([], [])
 
-# non animated daily iteration through drawing
-def daily_points():
-    # get the values of the planets at time t
+    # positions of every frame, computed once
+    xy = sim.get_positions(animation_times(frames))
 
-    t = 0
-    colors = ["r", "b", "g", "c", "m", "y"]
+    # called for frame i
+    def animate(i):
+        # uncomment to see moon orbit earth
+        # ax.set_xlim([xy[i, 1, 0] - EARTH_ORBIT_RAD, xy[i, 1, 0] + EARTH_ORBIT_RAD])
+        # ax.set_ylim([xy[i, 1, 1] - EARTH_ORBIT_RAD, xy[i, 1, 1] + EARTH_ORBIT_RAD])
 
-    while t < MAX_T:
+        # add it to animation
+        scatter.set_offsets(xy[i])
+        return scatter,
 
-        data = sim.get_stats(t)
-        index = 0
+    anim = animation.FuncAnimation(fig, animate, frames=frames, interval=20, blit=True)
+    plt.show()
 
-        
+
+# non animated daily iteration through drawing
+def daily_points():
+    # get the values of the planets for every day at once
+    xy = sim.get_positions(daily_times())
+
+    for frame in xy:
         plt.xlim(-SOLAR_SYSTEM_RAD, SOLAR_SYSTEM_RAD)
         plt.ylim(-SOLAR_SYSTEM_RAD, SOLAR_SYSTEM_RAD)
-        
-        for datam in data:
-            index = (index + 1) % len(colors)
-            plt.plot(datam["x"], datam["y"], colors[index] + 'o')
-            
 
-        t += SECONDS_IN_DAY
+        for index, (x, y) in enumerate(frame):
+            plt.plot(x, y, COLORS[(index + 1) % len(COLORS)] + 'o')
+
         plt.show()
-    
 
-animated()
+
+# create the figure of a render worker. It draws on the Agg canvas directly so
+# it never needs a display
+# entities: number of entities drawn per frame
+def init_renderer(entities, limit=SOLAR_SYSTEM_RAD, size=FRAME_SIZE):
+    global RENDERER
+
+    figure = Figure(figsize=(size / FRAME_DPI, size / FRAME_DPI), dpi=FRAME_DPI)
+    canvas = FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    ax.set_xlim([-limit, limit])
+    ax.set_ylim([-limit, limit])
+
+    # same colors as daily_points
+    colors = [COLORS[(index + 1) % len(COLORS)] for index in range(entities)]
+    scatter = ax.scatter(np.zeros(entities), np.zeros(entities), c=colors, animated=True)
+
+    # the axes never change, draw them once and only redraw the points
+    canvas.draw()
+    background = canvas.copy_from_bbox(figure.bbox)
+
+    RENDERER = (canvas, ax, scatter, background)
+
+
+# draw frames of shape (k, n, 2) with the worker's figure
+# returns the raw RGB bytes of every frame
+def render_frames(xy):
+    canvas, ax, scatter, background = RENDERER
+
+    frames = []
+    for frame in xy:
+        canvas.restore_region(background)
+        scatter.set_offsets(frame)
+        ax.draw_artist(scatter)
+        frames.append(np.asarray(canvas.buffer_rgba())[:, :, :3].tobytes())
+    return frames
+
+
+# frames only use a few flat colors, so they are mapped to a fixed palette
+# instead of quantizing every frame
+def write_gif(frames, path, size=FRAME_SIZE, fps=FPS):
+    images = [
+        Image.frombytes("RGB", (size, size), frame).convert(
+            "P", palette=Image.Palette.WEB, dither=Image.Dither.NONE
+        )
+        for frame in frames
+    ]
+    images[0].save(
+        path,
+        save_all=True,
+        append_images=images[1:],
+        duration=1000 / fps,
+        loop=0,
+        optimize=False,
+    )
+
+
+# stream the frames to ffmpeg, frames are encoded as they arrive
+# raises RuntimeError if ffmpeg is missing or fails
+def write_video(frames, path, size=FRAME_SIZE, fps=FPS):
+    if shutil.which("ffmpeg") is None:
+        raise RuntimeError("writing a video needs ffmpeg on the PATH")
+
+    encoder = subprocess.Popen(
+        [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{size}x{size}",
+            "-r", str(fps), "-i", "-",
+            "-pix_fmt", "yuv420p", path,
+        ],
+        stdin=subprocess.PIPE,
+    )
+    # ffmpeg is always waited on, so the video is complete when this returns
+    # and no process is left behind, even if writing a frame failed
+    try:
+        for frame in frames:
+            encoder.stdin.write(frame)
+    finally:
+        encoder.stdin.close()
+        code = encoder.wait()
+    if code != 0:
+        raise RuntimeError(f"ffmpeg failed to encode the video, exit code {code}")
+
+
+# render the positions at the given times to a gif or mp4 file, without a
+# display. Positions are computed in one batch, and frames are drawn on a
+# pool of worker processes and encoded in order
+def render(times, path, workers=None, limit=SOLAR_SYSTEM_RAD, size=FRAME_SIZE, fps=FPS):
+    xy = sim.get_positions(times)
+    tasks = [xy[i : i + FRAMES_PER_TASK] for i in range(0, len(xy), FRAMES_PER_TASK)]
+
+    with multiprocessing.Pool(
+        workers, initializer=init_renderer, initargs=(xy.shape[1], limit, size)
+    ) as pool:
+        frames = itertools.chain.from_iterable(pool.imap(render_frames, tasks))
+        if path.endswith(".gif"):
+            write_gif(frames, path, size, fps)
+        else:
+            write_video(frames, path, size, fps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Draw the orbits of physics_simulation.py")
+    parser.add_argument("output", nargs="?", default=None)
+    parser.add_argument("--daily", action="store_true")
+    parser.add_argument("--frames", type=int, default=ANIMATION_FRAMES)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.output is None:
+        if args.daily:
+            daily_points()
+        else:
+            animated(args.frames)
+        return
+
+    times = daily_times() if args.daily else animation_times(args.frames)
+    render(times, args.output, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# mergeable quantile sketches for message delays
+# a sketch keeps a count per logarithmic bucket of values, so any quantile is
+# known to within a relative error, whatever the number of values, and two
+# sketches built with the same accuracy merge by adding their counts.
+# based on DDSketch: https://arxiv.org/abs/1908.10693
+#
+# usage: python3 latency_sketch.py <sketch.json> [<sketch.json> ...]
+# merges every column of the given sketch files and prints its percentiles
+
+import json
+import math
+import sys
+
+import numpy as np
+
+# quantiles are within this fraction of the true value
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# values at or below this are counted as 0, delays are never negative
+MIN_VALUE = 1e-9
+
+# percentiles reported by default
+PERCENTILES = [50, 90, 99, 99.9]
+
+
+class LatencySketch:
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+
+        # bucket index -> number of values, bucket i holds
+        # (gamma^(i-1), gamma^i]
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    # add an array of values, nan values are ignored
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        positive = values[values > MIN_VALUE]
+        self.zero_count += len(values) - len(positive)
+
+        index = np.ceil(np.log(positive) / self.log_gamma).astype(np.int64)
+        for i, count in zip(*np.unique(index, return_counts=True)):
+            self.bins[int(i)] = self.bins.get(int(i), 0) + int(count)
+
+    # add the counts of another sketch with the same accuracy
+    def merge(self, other):
+        assert other.relative_accuracy == self.relative_accuracy, (
+            "can not merge sketches of different accuracies"
+        )
+        for i, count in other.bins.items():
+            self.bins[i] = self.bins.get(i, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    # value at quantile q, between 0 and 1
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return float("nan")
+
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+
+        seen = self.zero_count
+        for i in sorted(self.bins):
+            seen += self.bins[i]
+            if seen > rank:
+                # the middle of the bucket, relative to its bounds
+                value = 2 * self.gamma**i / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+
+        return self.max
+
+    # {percentile: value} for the given percentiles
+    def percentiles(self, percentiles=PERCENTILES):
+        return {p: self.quantile(p / 100) for p in percentiles}
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else float("nan")
+
+    def to_dict(self):
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "bins": {str(i): count for i, count in sorted(self.bins.items())},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["relative_accuracy"])
+        sketch.bins = {int(i): count for i, count in data["bins"].items()}
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.sum = data["sum"]
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
+
+
+# save a {column: LatencySketch} dict as json
+def save_sketches(sketches, path):
+    with open(path, "w") as file:
+        json.dump({column: sketch.to_dict() for column, sketch in sketches.items()}, file)
+
+
+def load_sketches(path):
+    with open(path, "r") as file:
+        return {column: LatencySketch.from_dict(data) for column, data in json.load(file).items()}
+
+
+# merge {column: LatencySketch} dicts column by column
+def merge_sketches(sketch_dicts):
+    merged = {}
+    for sketches in sketch_dicts:
+        for column, sketch in sketches.items():
+            if column not in merged:
+                merged[column] = LatencySketch(sketch.relative_accuracy)
+            merged[column].merge(sketch)
+    return merged
+
+
+# print the percentiles of every column
+def print_percentiles(sketches, percentiles=PERCENTILES):
+    for column, sketch in sketches.items():
+        print(f"{column} ({sketch.count} messages)")
+        if not sketch.count:
+            continue
+        values = sketch.percentiles(percentiles)
+        print("  " + "  ".join(f"p{p:g} {value:.6g}" for p, value in values.items()))
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("usage: python3 latency_sketch.py <sketch.json> [<sketch.json> ...]")
+        sys.exit(1)
+
+    print_percentiles(merge_sketches(load_sketches(path) for path in sys.argv[1:]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# link metrics at arbitrary times, interpolated from sparse physics samples
+# the distance of every link is sampled with its exact rate of change (from
+# the orbital velocities) on a uniform grid, and stored as one cubic Hermite
+# segment per grid interval. The error of every segment is checked against the
+# exact distance at its middle, where the error of a cubic Hermite segment
+# peaks. Whether a link is up comes from the transitions of contact_plan.py, so
+# it is exact to contact_plan.TIME_TOLERANCE and not interpolated.
+#
+# a query finds its segment in O(1) and its link state in O(log n), and every
+# query takes arrays of times (and of entities) to annotate many packets at once
+#
+# usage: python3 link_timeline.py <start> <end> <source> <destination> <t> [<t> ...]
+# prints the delay and error rate of the link at every time t (s)
+
+import sys
+
+import numpy as np
+
+import contact_plan
+import physics_simulation as sim
+
+
+class LinkTimeline:
+    # start, end: times covered by the timeline (s)
+    # step: spacing of the samples (s), defaults to the coarse scan spacing of
+    #       contact_plan.py
+    # entities: list of entities, defaults to initial_pos
+    # high_error: error rates as in get_stats
+    # memory is about 5 floats per link that can connect per sample
+    def __init__(self, start, end, step=None, entities=None, high_error: bool = True) -> None:
+        if entities is None:
+            entities = sim.initial_pos
+        if step is None:
+            step = contact_plan.default_resolution(entities)
+        if end <= start:
+            raise ValueError("the timeline must end after it starts")
+
+        self.start = float(start)
+        self.end = float(end)
+        self.high_error = high_error
+        self.registry = sim.get_registry(entities)
+
+        samples = max(2, int(np.ceil((end - start) / step)) + 1)
+        self.step = (self.end - self.start) / (samples - 1)
+        self.segments = samples - 1
+
+        # pair index of every (sender, receiver), -1 where there is no link
+        s, r = contact_plan.connectable_pairs(entities)
+        self.pair = np.full((len(entities), len(entities)), -1, dtype=np.intp)
+        self.pair[s, r] = np.arange(len(s))
+        self.pair[r, s] = np.arange(len(s))
+        self.index_of = {int(e_id): i for i, e_id in enumerate(self.registry.ids)}
+
+        times = np.linspace(self.start, self.end, samples)
+        distance, rate = self.__sample(times, s, r)
+
+        # segment k covers times[k] + u * step for u in [0, 1]
+        # value = c0 + c1 u + c2 u^2 + c3 u^3
+        d0, d1 = distance[:-1], distance[1:]
+        m0, m1 = rate[:-1] * self.step, rate[1:] * self.step
+        self.coefficients = np.stack(
+            (d0, m0, 3 * (d1 - d0) - 2 * m0 - m1, 2 * (d0 - d1) + m0 + m1), axis=-1
+        )
+
+        # error of every segment (m), shape (segments, pairs)
+        middle, _ = self.__sample(times[:-1] + self.step / 2, s, r)
+        self.error = np.abs(middle - self.__evaluate(np.arange(self.segments), 0.5))
+
+        # link state: the state of every pair at start, and the times it flips
+        initial, transitions = contact_plan.find_transitions(start, end, entities, self.step)
+        self.initial = np.asarray(initial, dtype=bool)
+        self.transitions = [[] for _ in range(len(s))]
+        for time, p, _ in transitions:
+            self.transitions[p].append(time)
+        self.transitions = [np.array(flips, dtype=np.float64) for flips in self.transitions]
+
+    # distance (m) and its rate of change (m/s) of every pair at times
+    def __sample(self, times, s, r):
+        distance = np.empty((len(times), len(s)))
+        rate = np.empty((len(times), len(s)))
+        # the temporaries hold x and y of every pair
+        step = contact_plan.chunk_samples(len(s), 2)
+        for begin in range(0, len(times), step):
+            chunk = times[begin : begin + step]
+            xy = self.registry.positions(chunk)
+            v = self.registry.velocities(chunk)
+            delta = xy[:, r] - xy[:, s]
+            relative = v[:, r] - v[:, s]
+            d = np.sqrt(delta[:, :, 0] ** 2 + delta[:, :, 1] ** 2)
+            distance[begin : begin + len(chunk)] = d
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rate[begin : begin + len(chunk)] = np.where(
+                    d > 0,
+                    (delta[:, :, 0] * relative[:, :, 0] + delta[:, :, 1] * relative[:, :, 1]) / d,
+                    0,
+                )
+        return distance, rate
+
+    # value of segment seg of pair p at fraction u of the segment
+    def __evaluate(self, seg, u, p=slice(None)):
+        c = self.coefficients[seg, p]
+        return ((c[..., 3] * u + c[..., 2]) * u + c[..., 1]) * u + c[..., 0]
+
+    # entity index of an entity id or name, or of an array of entity ids,
+    # raises KeyError for an unknown entity
+    def __indices(self, entity):
+        if isinstance(entity, str):
+            if entity not in self.registry.names:
+                raise KeyError(f"unknown entity {entity}")
+            return self.registry.names.index(entity)
+        ids = np.asarray(entity)
+        indices = [self.index_of.get(int(e_id), -1) for e_id in ids.ravel().tolist()]
+        if min(indices, default=0) < 0:
+            raise KeyError(f"unknown entity in {entity}")
+        return np.array(indices, dtype=np.intp).reshape(ids.shape)
+
+    # pair index, segment and fraction of every query, broadcast together,
+    # raises ValueError for times outside of the timeline
+    def __locate(self, src, dst, t):
+        t = np.asarray(t, dtype=np.float64)
+        within = (t >= self.start - contact_plan.TIME_TOLERANCE) & (
+            t <= self.end + contact_plan.TIME_TOLERANCE
+        )
+        if not np.all(within):
+            raise ValueError(f"times outside of the timeline [{self.start}, {self.end}]")
+        pair, t = np.broadcast_arrays(self.pair[self.__indices(src), self.__indices(dst)], t)
+
+        u = (t - self.start) / self.step
+        seg = np.clip(np.floor(u).astype(np.intp), 0, self.segments - 1)
+        return pair, seg, u - seg, t
+
+    # whether the link from src to dst is up at times t
+    # src, dst: entity ids or names, or arrays of entity ids
+    # t: time or array of times (s), broadcast against src and dst
+    def connected(self, src, dst, t):
+        pair, _, _, t = self.__locate(src, dst, t)
+        return self.__connected(pair, t)
+
+    def __connected(self, pair, t):
+        up = np.zeros(pair.shape, dtype=bool)
+        for p in np.unique(pair[pair >= 0]).tolist():
+            mask = pair == p
+            flips = np.searchsorted(self.transitions[p], t[mask], side="right")
+            up[mask] = self.initial[p] ^ (flips % 2 == 1)
+        return up
+
+    # distance (m) between src and dst at times t, nan where the link is down,
+    # see connected
+    def distance(self, src, dst, t):
+        pair, seg, u, t = self.__locate(src, dst, t)
+        up = self.__connected(pair, t)
+        distance = np.full(pair.shape, np.nan)
+        distance[up] = self.__evaluate(seg[up], u[up], pair[up])
+        return distance
+
+    # one way light time (s) from src to dst at times t, nan where the link is
+    # down, see connected
+    def delay(self, src, dst, t):
+        return sim.transmission_time(self.distance(src, dst, t))
+
+    # error rate from src to dst at times t, nan where the link is down
+    def error_rate(self, src, dst, t):
+        return sim.error_rate_from_distance(self.distance(src, dst, t), self.high_error)
+
+    # estimated error (s) of delay at times t, nan where there is no link
+    def delay_error(self, src, dst, t):
+        pair, seg, _, _ = self.__locate(src, dst, t)
+        error = np.full(pair.shape, np.nan)
+        error[pair >= 0] = self.error[seg[pair >= 0], pair[pair >= 0]]
+        return sim.transmission_time(error)
+
+    # largest estimated error of any delay in the timeline (s)
+    def max_delay_error(self):
+        return sim.transmission_time(float(self.error.max(initial=0)))
+
+
+def main():
+    if len(sys.argv) < 6:
+        print(
+            "usage: python3 link_timeline.py <start> <end> <source> <destination> "
+            "<t> [<t> ...]"
+        )
+        sys.exit(1)
+
+    timeline = LinkTimeline(float(sys.argv[1]), float(sys.argv[2]))
+    source, destination = sys.argv[3], sys.argv[4]
+    times = np.array([float(t) for t in sys.argv[5:]])
+
+    delay = timeline.delay(source, destination, times)
+    error_rate = timeline.error_rate(source, destination, times)
+    print(f"{timeline.segments} segments, delays within {timeline.max_delay_error():.3e} s")
+    for t, d, e in zip(times.tolist(), delay.tolist(), error_rate.tolist()):
+        if np.isnan(d):
+            print(f"t = {t}: no line of sight")
+        else:
+            print(f"t = {t}: delay {d:.6f} s, error rate {e:.6e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
 from enum import Enum
 import json
+import os
 import sys
+import time
+import numpy as np
 from ns import ns
-from physics_simulation import get_stats
+from atomic_file import atomic_write
+import catalogue
+import contact_plan
+import physics_simulation as sim
+import routing
+from run_profile import RunProfile, print_summary
 
 # NOTE ------------------------------------------------------------------------
 # Multiply all times output by this by 26 to get the correct time
@@ -12,9 +20,15 @@ from physics_simulation import get_stats
 # time out before they even arrive
 TIME_DIVIDER = 26
 
+# default largest change of a link delay (s, divided by TIME_DIVIDER) the
+# adaptive schedule lets build up before updating the topology
+MAX_DELAY_DRIFT = 1e-3
+
 ns.cppyy.cppdef(
     """
 #include "CPyCppyy/API.h"
+#include <cmath>
+#include <vector>
 
 // There literally is not any other way to do this
 // I hate having to call Python from C++, but c'est la vie
@@ -44,15 +58,230 @@ void set_channel_delay(NodeContainer c, int index, int interface, double seconds
 }
 
 // set the channel error
+// the error model of the device is reused once it has one
 void set_channel_error(NodeContainer c, int index, int interface, double rate) {
     Ptr<NetDevice> ch = c.Get(index)->GetDevice(interface);
-    Ptr<RateErrorModel> em = CreateObject<RateErrorModel>();
+
+    PointerValue current;
+    ch->GetAttribute("ReceiveErrorModel", current);
+    Ptr<RateErrorModel> em = current.Get<RateErrorModel>();
+    if (em) {
+        em->SetRate(rate);
+        return;
+    }
+
+    em = CreateObject<RateErrorModel>();
     em->SetAttribute("ErrorRate", DoubleValue(rate));
     em->SetUnit(RateErrorModel::ERROR_UNIT_BIT);
 
     ch->SetAttribute("ReceiveErrorModel", PointerValue(em));
 }
 
+// actions of apply_link_states, combined as bit flags
+const int LINK_SET_DELAY = 1;
+const int LINK_SET_ERROR = 2;
+const int LINK_SET_UP = 4;
+const int LINK_SET_DOWN = 8;
+
+// apply the link state of a whole topology update in one call
+// row k sets the (router index[k], interface[k]) link according to the
+// flags of action[k], using delay[k] (s) and error[k]
+void apply_link_states(
+    NodeContainer c,
+    int count,
+    const int* index,
+    const int* interface,
+    const double* delay,
+    const double* error,
+    const int* action
+) {
+    for (int k = 0; k < count; k++) {
+        if (action[k] & LINK_SET_DELAY) {
+            set_channel_delay(c, index[k], interface[k], delay[k]);
+        }
+        if (action[k] & LINK_SET_ERROR) {
+            set_channel_error(c, index[k], interface[k], error[k]);
+        }
+        if (action[k] & LINK_SET_UP) {
+            set_up(c, index[k], interface[k]);
+        }
+        if (action[k] & LINK_SET_DOWN) {
+            set_down(c, index[k], interface[k]);
+        }
+    }
+}
+
+// a precomputed topology timeline, applied by events scheduled in C++ so the
+// simulation never calls back into Python. Row k of step s is the state of
+// link (index[k], interface[k]) at that step, stored at s * links + k
+struct TopologyTimeline {
+    NodeContainer nodes;
+    int links = 0;
+    double delay_tolerance = 0;
+    double error_tolerance = 0;
+    std::vector<int> index;
+    std::vector<int> interface;
+    std::vector<int> up;
+    std::vector<double> delay;
+    std::vector<double> error;
+
+    // last state applied to each link, -1 / nan before the first step
+    std::vector<int> applied_up;
+    std::vector<double> applied_delay;
+    std::vector<double> applied_error;
+
+    // same order as the update_counts of the Network
+    long counts[8] = {0, 0, 0, 0, 0, 0, 0, 0};
+};
+
+TopologyTimeline timeline;
+
+// apply one step of the timeline, pushing only what changed
+void apply_timeline_step(int step) {
+    bool state_changed = false;
+
+    for (int k = 0; k < timeline.links; k++) {
+        int row = step * timeline.links + k;
+        bool up = timeline.up[row];
+
+        if (up) {
+            double delay = timeline.delay[row];
+            if (std::isnan(timeline.applied_delay[k])
+                || std::abs(delay - timeline.applied_delay[k]) > timeline.delay_tolerance) {
+                set_channel_delay(timeline.nodes, timeline.index[k], timeline.interface[k], delay);
+                timeline.applied_delay[k] = delay;
+                timeline.counts[0]++;
+            } else {
+                timeline.counts[1]++;
+            }
+
+            double error = timeline.error[row];
+            if (std::isnan(timeline.applied_error[k])
+                || std::abs(error - timeline.applied_error[k]) > timeline.error_tolerance) {
+                set_channel_error(timeline.nodes, timeline.index[k], timeline.interface[k], error);
+                timeline.applied_error[k] = error;
+                timeline.counts[2]++;
+            } else {
+                timeline.counts[3]++;
+            }
+        }
+
+        if (timeline.applied_up[k] == (int)up) {
+            timeline.counts[5]++;
+            continue;
+        }
+
+        if (up) {
+            set_up(timeline.nodes, timeline.index[k], timeline.interface[k]);
+        } else {
+            set_down(timeline.nodes, timeline.index[k], timeline.interface[k]);
+        }
+        timeline.applied_up[k] = up;
+        timeline.counts[4]++;
+        state_changed = true;
+    }
+
+    if (state_changed) {
+        Ipv4GlobalRoutingHelper::RecomputeRoutingTables();
+        timeline.counts[6]++;
+    } else {
+        timeline.counts[7]++;
+    }
+}
+
+// copy a timeline of steps steps over links links and schedule one event per
+// step at times[s] (s)
+void schedule_timeline(
+    NodeContainer c,
+    int steps,
+    int links,
+    const double* times,
+    const int* index,
+    const int* interface,
+    const int* up,
+    const double* delay,
+    const double* error,
+    double delay_tolerance,
+    double error_tolerance
+) {
+    timeline.nodes = c;
+    timeline.links = links;
+    timeline.delay_tolerance = delay_tolerance;
+    timeline.error_tolerance = error_tolerance;
+    timeline.index.assign(index, index + links);
+    timeline.interface.assign(interface, interface + links);
+    timeline.up.assign(up, up + steps * links);
+    timeline.delay.assign(delay, delay + steps * links);
+    timeline.error.assign(error, error + steps * links);
+    timeline.applied_up.assign(links, -1);
+    timeline.applied_delay.assign(links, std::nan(""));
+    timeline.applied_error.assign(links, std::nan(""));
+
+    for (int s = 0; s < steps; s++) {
+        Simulator::Schedule(Seconds(times[s]), &apply_timeline_step, s);
+    }
+}
+
+// counter i of the timeline, see TopologyTimeline::counts
+long timeline_count(int i) {
+    return timeline.counts[i];
+}
+
+// route packets to dest on router index over its link to router peer,
+// replacing any host route to dest the router had. The first interface
+// towards peer which is up is used. peer -1 only removes the route, leaving
+// dest to global routing
+void set_host_route(NodeContainer c, int index, int peer, Ipv4Address dest) {
+    Ptr<Node> node = c.Get(index);
+    Ptr<Ipv4> ipv4 = node->GetObject<Ipv4>();
+    Ipv4StaticRoutingHelper helper;
+    Ptr<Ipv4StaticRouting> routing = helper.GetStaticRouting(ipv4);
+
+    for (uint32_t r = routing->GetNRoutes(); r > 0; r--) {
+        Ipv4RoutingTableEntry entry = routing->GetRoute(r - 1);
+        if (entry.IsHost() && entry.GetDest() == dest) {
+            routing->RemoveRoute(r - 1);
+        }
+    }
+    if (peer < 0) {
+        return;
+    }
+
+    Ptr<Node> other = c.Get(peer);
+    for (uint32_t d = 0; d < node->GetNDevices(); d++) {
+        Ptr<NetDevice> device = node->GetDevice(d);
+        Ptr<Channel> channel = device->GetChannel();
+        int32_t interface = ipv4->GetInterfaceForDevice(device);
+        if (!channel || interface < 0 || !ipv4->IsUp(interface)) {
+            continue;
+        }
+
+        for (std::size_t k = 0; k < channel->GetNDevices(); k++) {
+            Ptr<NetDevice> end = channel->GetDevice(k);
+            if (end == device || end->GetNode() != other) {
+                continue;
+            }
+
+            Ptr<Ipv4> other_ipv4 = other->GetObject<Ipv4>();
+            int32_t other_interface = other_ipv4->GetInterfaceForDevice(end);
+            if (other_interface < 0) {
+                continue;
+            }
+            Ipv4Address next_hop = other_ipv4->GetAddress(other_interface, 0).GetLocal();
+            routing->AddHostRouteTo(dest, next_hop, interface);
+            return;
+        }
+    }
+}
+
+// set the host routes to dest of count routers in one call, router index[k]
+// forwards over its link to router peer[k], see set_host_route
+void apply_host_routes(NodeContainer c, int count, const int* index, const int* peer, Ipv4Address dest) {
+    for (int k = 0; k < count; k++) {
+        set_host_route(c, index[k], peer[k], dest);
+    }
+}
+
 // void turn on new reno
 void new_reno() {
     Config::SetDefault(
@@ -73,6 +302,14 @@ set_down = ns.cppyy.gbl.set_down
 set_up = ns.cppyy.gbl.set_up
 set_channel_delay = ns.cppyy.gbl.set_channel_delay
 set_channel_error = ns.cppyy.gbl.set_channel_error
+apply_link_states = ns.cppyy.gbl.apply_link_states
+apply_host_routes = ns.cppyy.gbl.apply_host_routes
+
+# flags of apply_link_states
+LINK_SET_DELAY = 1
+LINK_SET_ERROR = 2
+LINK_SET_UP = 4
+LINK_SET_DOWN = 8
 
 
 def update_topology():
@@ -94,12 +331,76 @@ class Network:
         receiver_body: str,
         time_step: int = 60,
         simulation_len: int = 60 * 60,
+        delay_tolerance: float = 0.0,
+        error_tolerance: float = 0.0,
+        high_error: bool = True,
+        trace_file: str = "network-sim.tr",
+        adaptive: bool = False,
+        max_delay_drift: float = MAX_DELAY_DRIFT,
+        profile_file: str = None,
+        progress_interval: float = None,
+        latency_routes: bool = False,
     ) -> None:
+        setup_started = time.perf_counter()
+
         # assign instance variables
+        self.start_time = start_time
         self.time = start_time
         self.protocol = protocol
         self.time_step = time_step
         self.simulation_len = simulation_len
+        self.high_error = high_error
+        self.trace_file = trace_file
+
+        # where a profile and phase timings are written after the run,
+        # defaults to next to the trace. With progress_interval a progress
+        # line is printed at most once per that many wall clock seconds
+        if profile_file is None:
+            profile_file = os.path.splitext(trace_file)[0] + ".profile.json"
+        self.profile_file = profile_file
+        self.profile = RunProfile(simulation_len, progress_interval)
+        self.profile.start()
+
+        # link changes smaller than these are not pushed to ns-3
+        # delay_tolerance: seconds of (divided) channel delay
+        # error_tolerance: absolute change in error rate
+        self.delay_tolerance = delay_tolerance
+        self.error_tolerance = error_tolerance
+
+        # with latency_routes=True every update also installs static host
+        # routes to the end devices along the minimum latency paths of
+        # routing.py, ahead of the hop count routes of global routing
+        self.latency_routes = latency_routes
+        self.routing = routing.RoutingTables() if latency_routes else None
+
+        # with adaptive=True the topology is updated at the predicted link
+        # transitions and whenever a delay drifts by max_delay_drift, instead
+        # of once per time_step. update_times holds the simulation times of
+        # the updates, None for the fixed time step
+        self.adaptive = adaptive
+        self.max_delay_drift = max_delay_drift
+        self.update_times = None
+        self.update_step = 0
+        if adaptive:
+            self.update_times = (
+                contact_plan.update_schedule(
+                    start_time,
+                    start_time + simulation_len,
+                    max_delay_drift * TIME_DIVIDER,
+                )
+                - start_time
+            )
+
+        self.update_counts = {
+            "delay_applied": 0,
+            "delay_skipped": 0,
+            "error_applied": 0,
+            "error_skipped": 0,
+            "state_applied": 0,
+            "state_skipped": 0,
+            "routing_recomputed": 0,
+            "routing_skipped": 0,
+        }
 
         # configure ns-3 options
         ns.Config.SetDefault(
@@ -112,74 +413,306 @@ class Network:
 
         # setup tracing
         self.ascii = ns.network.AsciiTraceHelper()
-        self.stream = self.ascii.CreateFileStream("network-sim.tr")
+        self.stream = self.ascii.CreateFileStream(self.trace_file)
 
         # setup the network
         self.ipv4 = ns.internet.Ipv4AddressHelper()
         self.__create_nodes()
+        self.__create_link_table()
         self.__connect_routers()
         self.__connect_end_devices(sender_body, receiver_body)
         ns.internet.Ipv4GlobalRoutingHelper.PopulateRoutingTables()
         self.__install_applications()
 
-    def run(self):
+        self.profile.add("setup", time.perf_counter() - setup_started)
+
+    # run the simulation
+    # timeline: a timeline from build_timeline or load_timeline. If given, the
+    #           topology updates are scheduled as C++ events from it instead
+    #           of calling update_topology from the simulation
+    def run(self, timeline=None):
         ns.core.LogComponentEnable("OnOffApplication", ns.core.LOG_LEVEL_INFO)
         ns.core.LogComponentEnable("PacketSink", ns.core.LOG_LEVEL_INFO)
 
         global NETWORK
         NETWORK = self
 
-        # schedule topology updates once per time step
-        curr = self.time_step
-        while curr < self.simulation_len:
-            ns.core.Simulator.Schedule(
-                ns.core.Seconds(curr), ns.cppyy.gbl.cpp_update_topology
-            )
-            curr += self.time_step
-
+        if timeline is not None and self.latency_routes:
+            raise ValueError("latency routes are installed by update_topology, not by a timeline")
+
+        started = time.perf_counter()
+        if timeline is not None:
+            self.__schedule_timeline(timeline)
+        elif self.update_times is not None:
+            for curr in self.update_times:
+                ns.core.Simulator.Schedule(
+                    ns.core.Seconds(curr), ns.cppyy.gbl.cpp_update_topology
+                )
+        else:
+            # schedule topology updates once per time step
+            curr = self.time_step
+            while curr < self.simulation_len:
+                ns.core.Simulator.Schedule(
+                    ns.core.Seconds(curr), ns.cppyy.gbl.cpp_update_topology
+                )
+                curr += self.time_step
+        started = self.profile.lap("schedule", started)
+
+        # update_topology is called from inside Run, whatever else Run spends
+        # its time on is ns-3 itself
+        updating = self.profile.seconds.get("update_topology", 0.0)
         ns.core.Simulator.Run()
+        self.profile.add(
+            "ns3",
+            time.perf_counter()
+            - started
+            - (self.profile.seconds.get("update_topology", 0.0) - updating),
+        )
+
+        if timeline is not None:
+            for i, name in enumerate(self.update_counts):
+                self.update_counts[name] += ns.cppyy.gbl.timeline_count(i)
+
         ns.core.Simulator.Destroy()
 
+        self.profile.advance(self.simulation_len)
+        self.profile.stop()
+        self.profile.counts.update(self.update_counts)
+        if self.latency_routes:
+            self.profile.counts.update(self.route_counts)
+        self.profile.save(self.profile_file)
+        if self.profile.progress_interval is not None:
+            print_summary(self.profile.summary())
+
+    # the link table of every topology update of the run, computed up front
+    # returns a dict of arrays:
+    # "times": simulation time of every update (s)
+    # "physics_times": time of the physics used by every update (s)
+    # "up", "delay", "error": (updates, links) state of every link
+    def build_timeline(self):
+        started = time.perf_counter()
+        if self.update_times is not None:
+            times = np.asarray(self.update_times, dtype=np.float64)
+            physics_times = self.start_time + times
+        else:
+            # update k runs at (k + 1) time steps into the simulation, with
+            # the physics of k time steps after the start, like update_topology
+            times = np.arange(self.time_step, self.simulation_len, self.time_step, dtype=np.float64)
+            physics_times = self.start_time + times - self.time_step
+
+        lap = time.perf_counter()
+        registry = sim.get_registry()
+        positions = registry.positions(physics_times)
+        lap = self.profile.lap("get_stats", lap)
+
+        up = np.zeros((len(times), len(self.link_index)), dtype=bool)
+        delay = np.zeros((len(times), len(self.link_index)))
+        error = np.zeros((len(times), len(self.link_index)))
+        for step, xy in enumerate(positions):
+            connected = sim.line_of_sight(xy, registry.radius, registry.can_connect)
+            up[step], delay[step], error[step] = self.link_table(xy, connected)
+        self.profile.lap("get_connections", lap)
+
+        self.profile.lap("build_timeline", started)
+        return {
+            **self.timeline_key(),
+            "times": times,
+            "physics_times": physics_times,
+            "index": self.link_index,
+            "interface": self.link_interface,
+            "up": up,
+            "delay": delay,
+            "error": error,
+        }
+
+    # everything a timeline depends on besides the links of the network, a
+    # saved timeline is only reused if all of it matches, see load_timeline
+    def timeline_key(self):
+        return {
+            "entities_hash": sim.get_registry().hash,
+            "adaptive": bool(self.adaptive),
+            "max_delay_drift": float(self.max_delay_drift) if self.adaptive else 0.0,
+            "start_time": float(self.start_time),
+            "time_step": float(self.time_step),
+            "simulation_len": float(self.simulation_len),
+            "high_error": bool(self.high_error),
+        }
+
+    def __schedule_timeline(self, timeline):
+        assert np.array_equal(timeline["index"], self.link_index) and np.array_equal(
+            timeline["interface"], self.link_interface
+        ), "timeline was built for a different network"
+
+        ns.cppyy.gbl.schedule_timeline(
+            self.routers,
+            len(timeline["times"]),
+            len(self.link_index),
+            np.ascontiguousarray(timeline["times"], dtype=np.float64),
+            np.ascontiguousarray(self.link_index, dtype=np.int32),
+            np.ascontiguousarray(self.link_interface, dtype=np.int32),
+            np.ascontiguousarray(timeline["up"], dtype=np.int32),
+            np.ascontiguousarray(timeline["delay"], dtype=np.float64),
+            np.ascontiguousarray(timeline["error"], dtype=np.float64),
+            self.delay_tolerance,
+            self.error_tolerance,
+        )
+
     def update_topology(self):
-        entities = get_stats(self.time)
-
-        for i in range(0, len(entities) - 1):
-            connections = [-1] * len(entities)
-            for i, conn in enumerate(entities[i]["connections"]):
-                connections[conn["id"]] = i
-            for j in range(i, len(entities)):
-                # since j>i, we know that interface # is the same as id
-                if connections[j] == -1:
-                    set_down(self.routers, i, j)
-                else:
-                    details = entities[i]["connections"][connections[j]]
-                    if details["connected"]:
-                        set_channel_delay(
-                            self.routers, i, j, details["trans_time"] / TIME_DIVIDER
-                        )
-                        # set_channel_delay(self.routers, i, j, 61.399)
-                        set_channel_error(self.routers, i, j, details["error_rate"])
-                        set_up(self.routers, i, j)
-                    else:
-                        set_down(self.routers, i, j)
-        ns.internet.Ipv4GlobalRoutingHelper.RecomputeRoutingTables()
-        self.time += self.time_step
+        started = time.perf_counter()
+        lap = started
+
+        # adaptive updates use the physics of the time they run at
+        if self.update_times is not None:
+            self.time = self.start_time + self.update_times[self.update_step]
+            self.update_step += 1
+
+        # get_link_state times the orbits and the line of sight on their own,
+        # physics also covers the disk cache lookup
+        xy, connected = sim.get_link_state_cached(self.time, self.profile)
+        lap = self.profile.lap("physics", lap)
+        up, delay, error = self.link_table(xy, connected)
+        lap = self.profile.lap("link_table", lap)
+
+        # only push what changed since the last update
+        known = ~np.isnan(self.applied_delay)
+        push_delay = up & ~(
+            known & (np.abs(delay - self.applied_delay) <= self.delay_tolerance)
+        )
+        known = ~np.isnan(self.applied_error)
+        push_error = up & ~(
+            known & (np.abs(error - self.applied_error) <= self.error_tolerance)
+        )
+        push_state = self.applied_up != up
+
+        action = (
+            LINK_SET_DELAY * push_delay
+            + LINK_SET_ERROR * push_error
+            + LINK_SET_UP * (push_state & up)
+            + LINK_SET_DOWN * (push_state & ~up)
+        ).astype(np.int32)
+        rows = np.flatnonzero(action)
+        lap = self.profile.lap("link_delta", lap)
+
+        if len(rows):
+            apply_link_states(
+                self.routers,
+                len(rows),
+                np.ascontiguousarray(self.link_index[rows]),
+                np.ascontiguousarray(self.link_interface[rows]),
+                np.ascontiguousarray(delay[rows]),
+                np.ascontiguousarray(error[rows]),
+                np.ascontiguousarray(action[rows]),
+            )
+            lap = self.profile.lap("apply_link_states", lap)
+
+        self.applied_delay[push_delay] = delay[push_delay]
+        self.applied_error[push_error] = error[push_error]
+        self.applied_up[push_state] = up[push_state]
+
+        self.update_counts["delay_applied"] += int(push_delay.sum())
+        self.update_counts["delay_skipped"] += int(up.sum() - push_delay.sum())
+        self.update_counts["error_applied"] += int(push_error.sum())
+        self.update_counts["error_skipped"] += int(up.sum() - push_error.sum())
+        self.update_counts["state_applied"] += int(push_state.sum())
+        self.update_counts["state_skipped"] += int(len(up) - push_state.sum())
+
+        # routes only depend on which links are up
+        if push_state.any():
+            lap = time.perf_counter()
+            ns.internet.Ipv4GlobalRoutingHelper.RecomputeRoutingTables()
+            self.profile.lap("routing", lap)
+            self.update_counts["routing_recomputed"] += 1
+        else:
+            self.update_counts["routing_skipped"] += 1
+
+        if self.latency_routes:
+            lap = time.perf_counter()
+            self.__install_latency_routes(xy, connected)
+            self.profile.lap("latency_routes", lap)
+
+        if self.update_times is None:
+            self.time += self.time_step
+
+        self.profile.lap("update_topology", started)
+        self.profile.advance(ns.core.Simulator.Now().GetSeconds())
+
+    # install the minimum latency host routes to both end devices for the
+    # links just applied, only on the routers whose next hop changed
+    def __install_latency_routes(self, xy, connected):
+        _, next_hop = self.routing.add(
+            (float(self.time), sim.get_registry().hash), routing.latency_weights(xy, connected)
+        )
+
+        routers = np.arange(self.num_routers)
+        for target, (router, address) in enumerate(self.route_targets):
+            # the router of the end device reaches it directly
+            peer = np.where(routers == router, -1, next_hop[:, router]).astype(np.int32)
+            rows = np.flatnonzero(peer != self.installed_routes[target])
+            if len(rows):
+                apply_host_routes(
+                    self.routers,
+                    len(rows),
+                    np.ascontiguousarray(rows, dtype=np.int32),
+                    np.ascontiguousarray(peer[rows]),
+                    address,
+                )
+            self.installed_routes[target] = peer
+
+            self.route_counts["routes_applied"] += len(rows)
+            self.route_counts["routes_skipped"] += len(peer) - len(rows)
+
+        self.route_counts["route_tables_full"] = self.routing.full
+        self.route_counts["route_tables_incremental"] = self.routing.incremental
+
+    # desired state of every link of the link table for the positions xy and
+    # connected matrix returned by get_link_state: up (bool), delay (s,
+    # divided by TIME_DIVIDER) and error rate, one entry per (router,
+    # interface) row. Since j >= i, interface j is the entity with id j
+    def link_table(self, xy, connected):
+        up = connected[self.link_index, self.link_interface]
+
+        delta = xy[self.link_interface] - xy[self.link_index]
+        distance = np.sqrt(delta[:, 0] ** 2 + delta[:, 1] ** 2)
+        delay = np.where(up, sim.transmission_time(distance) / TIME_DIVIDER, 0)
+        error = np.where(up, sim.error_rate_from_distance(distance, self.high_error), 0)
+
+        return up, delay, error
+
+    # one row per (router i, interface j) link with j >= i, the links
+    # update_topology controls, and the state last applied to each
+    def __create_link_table(self):
+        index = []
+        interface = []
+        for i in range(0, self.num_routers - 1):
+            for j in range(i, self.num_routers):
+                index.append(i)
+                interface.append(j)
+
+        self.link_index = np.array(index, dtype=np.int32)
+        self.link_interface = np.array(interface, dtype=np.int32)
+
+        # nothing is known about the channels yet, so the first update
+        # pushes everything
+        self.applied_up = np.full(len(index), -1, dtype=np.int8)
+        self.applied_delay = np.full(len(index), np.nan)
+        self.applied_error = np.full(len(index), np.nan)
 
     def __create_nodes(self):
         self.routers = ns.network.NodeContainer()
         self.sender = ns.network.NodeContainer()
         self.receiver = ns.network.NodeContainer()
 
-        # map entity names to ids
-        entities = get_stats(0)
+        # map entity names to ids, from the indexed entities so large
+        # catalogues do not compute every connection first
+        names = sim.get_registry().names
         self.entity_name_map = {}
         e_id = 0
-        for entity in entities:
-            self.entity_name_map[entity["name"]] = e_id
+        for name in names:
+            self.entity_name_map[name] = e_id
             e_id += 1
 
         # create one router for each entity and two end devices
-        self.num_routers = len(entities)
+        self.num_routers = len(names)
         self.routers.Create(self.num_routers)
         self.sender.Create(1)
         self.receiver.Create(1)
@@ -224,6 +757,22 @@ class Network:
         self.ipv4.NewNetwork()
         self.router_to_receiver_address = self.ipv4.Assign(self.router_to_receiver)
 
+        # the end devices latency routes lead to, with the router each one
+        # hangs off, and the next hop last installed on every router
+        self.route_targets = [
+            (receiver_id, self.router_to_receiver_address.GetAddress(1)),
+            (sender_id, self.sender_to_router_address.GetAddress(0)),
+        ]
+        self.installed_routes = [
+            np.full(self.num_routers, -2, dtype=np.int32) for _ in self.route_targets
+        ]
+        self.route_counts = {
+            "routes_applied": 0,
+            "routes_skipped": 0,
+            "route_tables_full": 0,
+            "route_tables_incremental": 0,
+        }
+
     def __install_applications(self):
         port = 9
 
@@ -257,22 +806,96 @@ class Network:
         apps_sink.Stop(ns.core.Seconds(self.simulation_len))
 
 
+# save a timeline from Network.build_timeline
+def save_timeline(timeline, path):
+    with atomic_write(path) as file:
+        np.savez(file, **timeline)
+
+
+# load a saved timeline
+# key: the timeline_key of the network it is for. Returns None if the file
+#      does not exist or was built for a different key, e.g. other entities
+def load_timeline(path, key=None):
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        timeline = {name: data[name] for name in data.files}
+
+    if key is not None:
+        for name, value in key.items():
+            if name not in timeline or timeline[name].item() != value:
+                return None
+    return timeline
+
+
+# the timeline of a network, loaded from path if it was saved there for the
+# same key, otherwise built and saved there
+def load_or_build_timeline(network, path):
+    timeline = load_timeline(path, network.timeline_key())
+    if timeline is None:
+        timeline = network.build_timeline()
+        save_timeline(timeline, path)
+    return timeline
+
+
+# the Protocol for a protocol name given on the command line
+# returns None if the protocol is not supported
+def parse_protocol(name: str):
+    if name == "UDP":
+        return Protocol.UDP
+    elif name == "TCP":
+        return Protocol.TCP
+    elif name == "NewReno":
+        return Protocol.NEW_RENO
+    return None
+
+
 def main():
     if len(sys.argv) < 2:
         print("Protocol not specified")
         sys.exit(1)
-    elif sys.argv[1] == "UDP":
-        protocol = Protocol.UDP
-    elif sys.argv[1] == "TCP":
-        protocol = Protocol.TCP
-    elif sys.argv[1] == "NewReno":
-        protocol = Protocol.NEW_RENO
-    else:
+
+    protocol = parse_protocol(sys.argv[1])
+    if protocol is None:
         print(f"Protocol {sys.argv[1]} is not supported")
         sys.exit(1)
 
-    network = Network(10000, protocol, "Earth", "Mars")
-    network.run()
+    # python3 network_sim.py <protocol> [--adaptive] [--timeline <file>]
+    #                         [--progress <seconds>] [--catalogue <file>]
+    #                         [--latency-routes]
+    # --adaptive updates the topology at predicted link changes instead of
+    # once per time step
+    # --latency-routes routes the end devices over the minimum latency paths
+    # of routing.py instead of the fewest hops, it can not be combined with
+    # --timeline
+    # --catalogue loads the entities from a catalogue file, see catalogue.py
+    # --progress prints a progress line at most once per that many seconds,
+    # and the profile of the run at the end
+    if "--catalogue" in sys.argv[2:]:
+        catalogue.use_catalogue(sys.argv[sys.argv.index("--catalogue") + 1])
+
+    progress_interval = None
+    if "--progress" in sys.argv[2:]:
+        progress_interval = float(sys.argv[sys.argv.index("--progress") + 1])
+
+    network = Network(
+        10000,
+        protocol,
+        "Earth",
+        "Mars",
+        adaptive="--adaptive" in sys.argv[2:],
+        progress_interval=progress_interval,
+        latency_routes="--latency-routes" in sys.argv[2:],
+    )
+
+    # --timeline precomputes the topology before the simulation, reusing the
+    # file if it was saved for the same entities and settings, and saving it
+    # there otherwise
+    if "--timeline" in sys.argv[2:]:
+        path = sys.argv[sys.argv.index("--timeline") + 1]
+        network.run(load_or_build_timeline(network, path))
+    else:
+        network.run()
 
 
 if __name__=="__main__":
@@ -1,5 +1,11 @@
 import math
 import json
+import hashlib
+import os
+import pickle
+import time
+import numpy as np
+from atomic_file import atomic_write
 
 # Speed of light m/s
 C = 299792458.0
@@ -7,6 +13,16 @@ C = 299792458.0
 # Transmission Frequency (Hz)
 T_FREQ = 3e10
 
+# a link profile is a dict with:
+# "name": optional name of the band
+# "frequency": transmission frequency (Hz)
+# "tx_gain", "rx_gain": antenna gains of the sender and receiver (dBi)
+# the default is the Ka-band link with isotropic antennas used everywhere else
+DEFAULT_PROFILE = {"name": "Ka", "frequency": T_FREQ, "tx_gain": 0.0, "rx_gain": 0.0}
+
+# error rates are scaled by this in 'high_error' mode, up to 100%
+HIGH_ERROR_FACTOR = 10**10
+
 # sun is at polar coordinates 0, 0
 
 # average sun radius:  695 508 000 m
@@ -40,6 +56,9 @@ T_FREQ = 3e10
 # radius: radius of the entity (m)
 # can_connect: if the entity can connect to the interplanetary internet
 # orbital_direction: 1 for counter_clockwise, -1 for clockwise
+# phase: optional, angle of the entity around its orbit at time 0 (degrees),
+#        defaults to 0
+# see catalogue.py to load entities from a file instead
 initial_pos = [
     {  # Sun
         "id": 0,
@@ -108,8 +127,9 @@ initial_pos = [
 # x, y are the points for the orbital center
 # radius is the radius of the orbit
 # period is the period of the orbit
-def calc_orbit_position(init_x, init_y, radius, period, time, orbital_direction):
-    angle = time / period * 360.0 * orbital_direction
+# phase is the angle at time 0 (degrees)
+def calc_orbit_position(init_x, init_y, radius, period, time, orbital_direction, phase=0):
+    angle = time / period * 360.0 * orbital_direction + phase
 
     y = math.sin(math.radians(angle)) * radius
     x = math.cos(math.radians(angle)) * radius
@@ -146,6 +166,7 @@ def get_entity_stats(t, entity_stats, stat_list):
         entity_stats["period"],
         t,
         entity_stats["orbital_direction"],
+        entity_stats.get("phase", 0),
     )
 
     return {
@@ -163,34 +184,322 @@ def get_entity_stats(t, entity_stats, stat_list):
 
 
 # returns information for all entities at time time t
-def get_stats(t: int, high_error: bool = True):
-
-    stats = []
-
-    for entity in initial_pos:
-        if entity["orb_id"] == -1:
-            # is the sun
-            stats.append(
-                {
-                    "id": 0,
-                    "name": "Sun",
-                    "orbital_radius": 0,
-                    "orb_id": -1,
-                    "period": 1,
-                    "radius": 695508000,
-                    "can_connect": False,
-                    "orbital_direction": 1,
-                    "x": 0,
-                    "y": 0,
-                }
+# the positions and connections are computed on the arrays of the entity
+# registry, the list of dicts is only built for the result
+# profile: optional RunProfile, the orbits are timed as the "get_stats" phase
+#          and the connections as the "get_connections" phase
+def get_stats(t: int, high_error: bool = True, profile=None):
+    started = time.perf_counter()
+    xy, connected = get_link_state(t, profile)
+
+    stats = get_registry().stats_view(xy)
+    stats = attach_connections(stats, connected, distance_matrix(xy), high_error)
+    if profile is not None:
+        profile.lap("stats_view", started)
+
+    return stats
+
+
+# positions and line of sight of all entities at time t, the arrays get_stats
+# builds its result from, without a dict per entity or connection
+# returns xy of shape (n, 2) (m) and the (n, n) connected matrix of
+# line_of_sight, both indexed like initial_pos
+# profile: optional RunProfile, timed as in get_stats
+def get_link_state(t, profile=None):
+    started = time.perf_counter()
+    registry = get_registry()
+    xy = registry.positions([t])[0]
+    if profile is not None:
+        started = profile.lap("get_stats", started)
+
+    connected = line_of_sight(xy, registry.radius, registry.can_connect)
+    if profile is not None:
+        profile.lap("get_connections", started)
+
+    return xy, connected
+
+
+# fingerprint of an entity configuration, changes whenever any field of any
+# entity changes
+# the fields are hashed as one canonical tuple, so the hash does not depend on
+# the order of the fields in each dict or on how the values were parsed
+def entities_hash(entities=None):
+    if entities is None:
+        entities = initial_pos
+    canonical = tuple(
+        (
+            int(entity["id"]),
+            str(entity["name"]),
+            float(entity["orbital_radius"]),
+            int(entity["orb_id"]),
+            float(entity["period"]),
+            float(entity["radius"]),
+            bool(entity["can_connect"]),
+            int(entity["orbital_direction"]),
+            float(entity.get("phase", 0)),
+        )
+        for entity in entities
+    )
+    return hashlib.sha1(repr(canonical).encode()).hexdigest()
+
+
+# replace the entities in place, so every module holding initial_pos sees
+# them, and index them for get_registry
+# entities: list of entities, e.g. from catalogue.load_catalogue
+def set_entities(entities):
+    initial_pos[:] = entities
+    clear_registry()
+    return get_registry()
+
+
+# disk cache of get_link_state results, keyed on (t, entities_hash)
+# If path is set, every result is written to that directory so later runs,
+# including other processes, can reuse it. Without a path nothing is cached:
+# a run uses every time once, so only other runs can reuse a result. The key
+# contains the hash of the entity configuration, which get_registry
+# recomputes whenever initial_pos changes, so edited entities never return
+# stale results.
+# Cached results are shared between callers and must be treated as read only
+class StatsCache:
+    def __init__(self, path: str = None) -> None:
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+    def __file(self, key):
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.path, key[1], name + ".pkl")
+
+    # get_link_state through the cache
+    # profile: passed on to get_link_state on a miss
+    def link_state(self, t, profile=None):
+        if self.path is None:
+            return get_link_state(t, profile)
+
+        key = (float(t), get_registry().hash)
+        try:
+            with open(self.__file(key), "rb") as file:
+                result = pickle.load(file)
+            self.hits += 1
+            return result
+        except (OSError, pickle.PickleError, EOFError):
+            pass
+
+        self.misses += 1
+        result = get_link_state(t, profile)
+        self.__store(key, result)
+        return result
+
+    def __store(self, key, result):
+        file_name = self.__file(key)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+
+        with atomic_write(file_name) as file:
+            pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+# set IPN_STATS_CACHE to a directory to keep results across runs
+STATS_CACHE = StatsCache(path=os.environ.get("IPN_STATS_CACHE"))
+
+
+# get_link_state through STATS_CACHE, the arrays must not be modified
+def get_link_state_cached(t: int, profile=None):
+    return STATS_CACHE.link_state(t, profile)
+
+
+# resolve the orbital hierarchy of a list of entities once
+# returns the indices of the entities ordered so that every entity comes after
+# the entity it orbits (a topological sort), and the index of the orbited
+# entity for each entity (-1 for entities that do not orbit anything, i.e. the
+# sun)
+def resolve_orbit_order(entities):
+    index_of = {entity["id"]: i for i, entity in enumerate(entities)}
+    parents = []
+    for entity in entities:
+        if entity["orb_id"] != -1 and entity["orb_id"] not in index_of:
+            raise ValueError(f"{entity['name']} orbits unknown entity {entity['orb_id']}")
+        parents.append(index_of[entity["orb_id"]] if entity["orb_id"] != -1 else -1)
+
+    children = [[] for _ in entities]
+    for i, parent in enumerate(parents):
+        if parent != -1:
+            children[parent].append(i)
+
+    order = [i for i, parent in enumerate(parents) if parent == -1]
+    for i in order:
+        order.extend(children[i])
+
+    if len(order) != len(entities):
+        raise ValueError("orbital hierarchy contains a cycle")
+
+    return order, parents
+
+
+# array backed copy of a list of entities, indexed once
+# every field of the entities is held in one array per field, in the same order
+# as the list. The orbital hierarchy is resolved when the registry is built
+# and split into levels: entities orbiting the sun, entities orbiting those,
+# and so on, so positions are evaluated one level at a time
+class EntityRegistry:
+    __slots__ = (
+        "entities",
+        "fingerprint",
+        "hash",
+        "ids",
+        "names",
+        "orbital_radius",
+        "parents",
+        "period",
+        "radius",
+        "can_connect",
+        "orbital_direction",
+        "phase",
+        "levels",
+    )
+
+    def __init__(self, entities, entities_hash: str = None) -> None:
+        self.entities = entities
+        self.fingerprint = entities_fingerprint(entities)
+        self.hash = entities_hash
+
+        self.ids = np.array([entity["id"] for entity in entities], dtype=np.int64)
+        self.names = [entity["name"] for entity in entities]
+        self.orbital_radius = np.array(
+            [entity["orbital_radius"] for entity in entities], dtype=np.float64
+        )
+        self.period = np.array([entity["period"] for entity in entities], dtype=np.float64)
+        self.radius = np.array([entity["radius"] for entity in entities], dtype=np.float64)
+        self.can_connect = np.array(
+            [entity["can_connect"] for entity in entities], dtype=bool
+        )
+        self.orbital_direction = np.array(
+            [entity["orbital_direction"] for entity in entities], dtype=np.float64
+        )
+        self.phase = np.array([entity.get("phase", 0) for entity in entities], dtype=np.float64)
+
+        order, parents = resolve_orbit_order(entities)
+        self.parents = np.array(parents, dtype=np.intp)
+
+        depth = [0] * len(entities)
+        for i in order:
+            if parents[i] != -1:
+                depth[i] = depth[parents[i]] + 1
+        self.levels = [
+            np.array([i for i in order if depth[i] == level], dtype=np.intp)
+            for level in range(1, max(depth, default=0) + 1)
+        ]
+
+    def __len__(self):
+        return len(self.ids)
+
+    # positions of all entities at every time in times, see get_positions
+    def positions(self, times):
+        times = np.asarray(times, dtype=np.float64).ravel()
+        positions = np.zeros((times.size, len(self), 2))
+
+        # the entities which orbit nothing (the sun) sit at the origin
+        for level in self.levels:
+            parents = self.parents[level]
+
+            # same arithmetic as calc_orbit_position so both paths agree
+            angle = np.radians(
+                times[:, None] / self.period[level] * 360.0 * self.orbital_direction[level]
+                + self.phase[level]
+            )
+            positions[:, level, 0] = positions[:, parents, 0] + (
+                np.cos(angle) * self.orbital_radius[level]
             )
-        else:
-            entity_stats = get_entity_stats(t, entity, stats)
+            positions[:, level, 1] = positions[:, parents, 1] + (
+                np.sin(angle) * self.orbital_radius[level]
+            )
+
+        return positions
+
+    # velocities of all entities at every time in times, see get_velocities
+    def velocities(self, times):
+        times = np.asarray(times, dtype=np.float64).ravel()
+        velocities = np.zeros((times.size, len(self), 2))
+
+        for level in self.levels:
+            parents = self.parents[level]
+
+            angle = np.radians(
+                times[:, None] / self.period[level] * 360.0 * self.orbital_direction[level]
+                + self.phase[level]
+            )
+            # derivative of the position, the speed along a circular orbit is
+            # its circumference over its period
+            speed = (
+                2 * np.pi * self.orbital_radius[level] / self.period[level]
+                * self.orbital_direction[level]
+            )
+            velocities[:, level, 0] = velocities[:, parents, 0] - np.sin(angle) * speed
+            velocities[:, level, 1] = velocities[:, parents, 1] + np.cos(angle) * speed
+
+        return velocities
+
+    # the entities as the list of dicts returned by get_stats, at the
+    # positions xy of shape (n, 2)
+    def stats_view(self, xy):
+        stats = []
+        for entity, (x, y) in zip(self.entities, xy.tolist()):
+            entity_stats = dict(entity)
+            entity_stats["x"] = x
+            entity_stats["y"] = y
             stats.append(entity_stats)
+        return stats
 
-    stats = get_connections(stats, high_error)
 
-    return stats
+# the registry of the last list of entities it was requested for
+REGISTRY = None
+
+
+# shallow snapshot of the fields of every entity, compared on every
+# get_registry call to notice entities added, removed or edited in place
+def entities_fingerprint(entities):
+    return tuple(tuple(entity.items()) for entity in entities)
+
+
+# get the EntityRegistry for a list of entities, defaults to initial_pos
+# the registry is kept while the same list holds the same entities, so it is
+# only hashed and indexed again when the list or any of its entities changes
+def get_registry(entities=None):
+    global REGISTRY
+
+    if entities is None:
+        entities = initial_pos
+
+    if (
+        REGISTRY is None
+        or REGISTRY.entities is not entities
+        or REGISTRY.fingerprint != entities_fingerprint(entities)
+    ):
+        REGISTRY = EntityRegistry(entities, entities_hash(entities))
+
+    return REGISTRY
+
+
+# forget the registry, the next get_registry call indexes its entities again
+def clear_registry():
+    global REGISTRY
+    REGISTRY = None
+
+
+# returns the positions of all entities at every time in times
+# vectorized version of get_stats for when only the coordinates are needed
+# times: array of times (s)
+# entities: list of entities, defaults to initial_pos
+# returns an array of shape (len(times), len(entities), 2) holding x, y (m),
+# with entities in the same order as get_stats
+def get_positions(times, entities=None):
+    return get_registry(entities).positions(times)
+
+
+# returns the velocities of all entities at every time in times, the exact
+# derivative of get_positions
+# returns an array of shape (len(times), len(entities), 2) holding vx, vy (m/s)
+def get_velocities(times, entities=None):
+    return get_registry(entities).velocities(times)
 
 
 # given two points to make a line, and a point
@@ -239,6 +548,186 @@ def point_dist_to_line(
     return math.sqrt(dx * dx + dy * dy)
 
 
+# number of (sender, receiver, blocker) triples evaluated at once by
+# line_of_sight_dense, bounds the size of the temporary arrays
+LINE_OF_SIGHT_CHUNK = 2**18
+
+# past this many entities line_of_sight culls blockers before the exact test
+BROAD_PHASE_MIN_ENTITIES = 64
+
+# slack (radians) added to the angular window of each blocker in the broad
+# phase so rounding can never reject a blocker the exact test would accept
+BROAD_PHASE_MARGIN = 1e-9
+
+
+# vectorized line of sight check between every pair of entities
+# xy: array of shape (n, 2) with the x, y coordinates of every entity (m)
+# radius: array of shape (n,) with the radius of every entity (m)
+# can_connect: array of shape (n,) of bools
+# returns a (n, n) bool matrix, where [i][j] is true if i can send to j.
+# A pair is connected if both entities can connect and no third entity lies
+# closer to the segment between them than its own radius, the same test
+# point_dist_to_line performs for a single triple
+def line_of_sight(xy, radius, can_connect):
+    if len(xy) >= BROAD_PHASE_MIN_ENTITIES:
+        return line_of_sight_culled(xy, radius, can_connect)
+    return line_of_sight_dense(xy, radius, can_connect)
+
+
+# line_of_sight testing every (sender, receiver, blocker) triple, O(n^3)
+def line_of_sight_dense(xy, radius, can_connect):
+    xy = np.asarray(xy, dtype=np.float64)
+    radius = np.asarray(radius, dtype=np.float64)
+    can_connect = np.asarray(can_connect, dtype=bool)
+    n = len(xy)
+
+    connected = can_connect[:, None] & can_connect[None, :]
+    np.fill_diagonal(connected, False)
+
+    radius_sq = radius * radius
+    senders = np.flatnonzero(can_connect)
+    chunk = max(1, LINE_OF_SIGHT_CHUNK // max(1, n * n))
+    ids = np.arange(n)
+
+    for begin in range(0, len(senders), chunk):
+        s = senders[begin : begin + chunk]
+
+        # receivers and blockers are the same entities, so the segment from
+        # sender s to receiver r and the vector from sender s to blocker b
+        # share the same offsets, shape (s, n)
+        c = xy[None, :, 0] - xy[s, None, 0]
+        d = xy[None, :, 1] - xy[s, None, 1]
+        len_sq = c * c + d * d
+        a, b = c, d
+
+        # projection of every blocker onto every segment, shape (s, r, b)
+        param = a[:, None, :] * c[:, :, None]
+        param += b[:, None, :] * d[:, :, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            param /= len_sq[:, :, None]
+        # in case of 0 length line the sender is the closest point
+        param[len_sq == 0] = 0
+        np.clip(param, 0, 1, out=param)
+
+        # squared distance from every blocker to the closest point
+        dx = a[:, None, :] - param * c[:, :, None]
+        param *= d[:, :, None]
+        np.subtract(b[:, None, :], param, out=param)
+        dx *= dx
+        param *= param
+        dx += param
+        blocking = dx < radius_sq[None, None, :]
+
+        # an entity can not block a link it is part of
+        rows = np.arange(len(s))
+        blocking[rows, :, s] = False
+        blocking[:, ids, ids] = False
+
+        connected[s] &= ~blocking.any(axis=2)
+
+    return connected
+
+
+# line_of_sight with a broad phase that rejects impossible blockers first
+# Seen from a sender, a blocker of radius R at distance D can only come within
+# R of a segment whose direction is less than asin(R / D) away from the
+# direction of the blocker. For each sender, receivers are indexed by their
+# angle, and every blocker only tests the receivers inside its angular window.
+# Entities with no radius never block and are dropped up front. Only the
+# surviving (receiver, blocker) pairs go through the exact distance test, so a
+# link costs O(k) for k blockers that could actually be in the way, instead of
+# O(n) for every entity
+def line_of_sight_culled(xy, radius, can_connect):
+    xy = np.asarray(xy, dtype=np.float64)
+    radius = np.asarray(radius, dtype=np.float64)
+    can_connect = np.asarray(can_connect, dtype=bool)
+
+    connected = can_connect[:, None] & can_connect[None, :]
+    np.fill_diagonal(connected, False)
+
+    blockers = np.flatnonzero(radius > 0)
+    receivers = np.flatnonzero(can_connect)
+    if len(blockers) == 0 or len(receivers) < 2:
+        return connected
+
+    for s in receivers:
+        rel = xy - xy[s]
+        angle = np.arctan2(rel[:, 1], rel[:, 0])
+
+        # index the receivers of this sender by angle, repeated one turn
+        # below and above so windows crossing -pi/pi need no special case
+        r = receivers[receivers != s]
+        r = r[np.argsort(angle[r])]
+        r_angle = angle[r]
+        wrapped = np.concatenate((r_angle - 2 * np.pi, r_angle, r_angle + 2 * np.pi))
+
+        # angular half width of every blocker, seen from the sender
+        b = blockers[blockers != s]
+        b_dist = np.hypot(rel[b, 0], rel[b, 1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = radius[b] / b_dist
+        # a sender inside a blocker can be blocked in any direction
+        width = np.where(ratio < 1, np.arcsin(np.minimum(ratio, 1)), np.pi)
+        width += BROAD_PHASE_MARGIN
+
+        lo = np.searchsorted(wrapped, angle[b] - width, side="left")
+        hi = np.searchsorted(wrapped, angle[b] + width, side="right")
+        counts = hi - lo
+        if counts.sum() == 0:
+            continue
+
+        # expand every blocker's window into (receiver, blocker) candidates
+        cand_b = np.repeat(b, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cand_r = r[(np.repeat(lo, counts) + offsets) % len(r)]
+
+        keep = cand_r != cand_b
+        cand_r = cand_r[keep]
+        cand_b = cand_b[keep]
+
+        # exact test, the same arithmetic as line_of_sight_dense
+        c = rel[cand_r, 0]
+        d = rel[cand_r, 1]
+        a = rel[cand_b, 0]
+        bb = rel[cand_b, 1]
+        len_sq = c * c + d * d
+        with np.errstate(divide="ignore", invalid="ignore"):
+            param = (a * c + bb * d) / len_sq
+        param[len_sq == 0] = 0
+        np.clip(param, 0, 1, out=param)
+        dx = a - param * c
+        dy = bb - param * d
+
+        blocked = cand_r[dx * dx + dy * dy < radius[cand_b] ** 2]
+        connected[s, blocked] = False
+
+    return connected
+
+
+# matrix form of get_connections
+# stats: the list of entities returned by get_stats, or any list of entities
+#        with "x", "y", "radius" and "can_connect"
+# returns (connected, distance), two (n, n) matrices indexed like stats.
+# distance is nan for pairs which are not connected
+def get_connection_matrix(stats):
+    xy = np.array([[entity["x"], entity["y"]] for entity in stats], dtype=np.float64)
+    radius = np.array([entity["radius"] for entity in stats], dtype=np.float64)
+    can_connect = np.array([entity["can_connect"] for entity in stats], dtype=bool)
+
+    connected = line_of_sight(xy, radius, can_connect)
+
+    distance = distance_matrix(xy)
+    distance[~connected] = np.nan
+
+    return connected, distance
+
+
+# distance (m) between every pair of points of xy, of shape (n, 2)
+def distance_matrix(xy):
+    delta = xy[None, :, :] - xy[:, None, :]
+    return np.sqrt(delta[:, :, 0] ** 2 + delta[:, :, 1] ** 2)
+
+
 # get the connections between any entities
 # checking if an entity has a direct line of sight with the other entities
 # takes in a data structure stats which has all of the meta data for all of the
@@ -253,48 +742,31 @@ def point_dist_to_line(
 # "x": x coordinate in space (m)
 # "y": y coordinate in space (m)
 def get_connections(stats, high_error):
+    connected, distance = get_connection_matrix(stats)
+    return attach_connections(stats, connected, distance, high_error)
+
 
-    # If anyone has a better idea that isnt O(n^3) I am listening
-    for entity_sending in stats:
+# fill in the "connections" of every entity of stats from the connected and
+# distance matrices, see get_connections
+def attach_connections(stats, connected, distance, high_error):
+    error_rate = error_rate_from_distance(distance, high_error)
+
+    for i, entity_sending in enumerate(stats):
         entity_sending["connections"] = []
 
-        for entity_receiving in stats:
+        for j, entity_receiving in enumerate(stats):
             # skips checking if 2 of the 3 identities are the same
             if (
                 entity_receiving["id"] != entity_sending["id"]
                 and entity_receiving["can_connect"]
                 and entity_sending["can_connect"]
             ):
-                blocking = False
-
-                # check if entities are blocking
-                for entity_blocking in stats:
-                    if (
-                        entity_receiving["id"]
-                        != entity_blocking["id"]
-                        != entity_sending["id"]
-                    ):
-                        dist = point_dist_to_line(
-                            entity_sending["x"],
-                            entity_sending["y"],
-                            entity_receiving["x"],
-                            entity_receiving["y"],
-                            entity_blocking["x"],
-                            entity_blocking["y"],
-                        )
-
-                        if dist < entity_blocking["radius"]:
-                            blocking = True
+                blocking = not connected[i][j]
 
                 if not blocking:
-                    dist = dist_between_points(
-                        entity_receiving["x"],
-                        entity_receiving["y"],
-                        entity_sending["x"],
-                        entity_sending["y"],
-                    )
+                    dist = float(distance[i][j])
                     trans_time = transmission_time(dist)
-                    err_rate = get_error_rate(entity_sending, entity_receiving, high_error)
+                    err_rate = float(error_rate[i][j])
                 else:
                     dist = None
                     trans_time = None
@@ -313,7 +785,6 @@ def get_connections(stats, high_error):
 
     return stats
 
-
 # sending messages at speed of light
 # given a distance how long does it take
 def transmission_time(dist):
@@ -325,19 +796,58 @@ def dist_between_points(x1, y1, x2, y2):
     return math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
 
 
-# Calculate the free space path loss between 2 points
+# received over transmitted power of every link, for every profile
+# free space path loss with the antenna gains of each profile
 # https://en.wikipedia.org/wiki/Free-space_path_loss#Free-space_path_loss_formula
-def free_space_path_loss(x1, y1, x2, y2) -> float:
-    # Define the transmission frequency (30GHz, middle of Ka-band) and calculate wavelength
-    wavelength = C / T_FREQ
+# distance: array of distances (m) of any shape, e.g. from distance_matrix
+# profiles: list of link profiles, see DEFAULT_PROFILE
+# high_error: scale the error rates as get_error_rate does
+# dtype: np.float32 halves the memory of large constellations, any dtype
+#        spelling numpy accepts works, e.g. "float32" or np.dtype("float32")
+# returns the loss ratio and the error rate arrays, both of shape
+# (len(profiles),) + distance.shape. A distance of 0 gets an infinite ratio
+def link_budget(distance, profiles=None, high_error: bool = True, dtype=np.float64):
+    dtype = np.dtype(dtype).type
+    if profiles is None:
+        profiles = [DEFAULT_PROFILE]
+
+    distance = np.asarray(distance, dtype=dtype)
+    loss = np.empty((len(profiles),) + distance.shape, dtype=dtype)
+
+    with np.errstate(divide="ignore"):
+        for band, profile in enumerate(profiles):
+            wavelength = C / profile["frequency"]
+            gain = 10 ** ((profile.get("tx_gain", 0.0) + profile.get("rx_gain", 0.0)) / 10)
+
+            # same order of operations as the scalar formula, in place
+            out = loss[band, ...]
+            np.multiply(distance, 4 * math.pi, out=out)
+            np.divide(dtype(wavelength), out, out=out)
+            np.square(out, out=out)
+            if gain != 1:
+                out *= dtype(gain)
+
+    # the error rate of a link is modelled by its loss ratio
+    error_rate = loss.copy()
+    if high_error:
+        error_rate *= dtype(HIGH_ERROR_FACTOR)
+        np.minimum(error_rate, 1, out=error_rate)
+
+    return loss, error_rate
 
-    # Distance between the points in m
-    distance = dist_between_points(x1, y1, x2, y2)
 
-    # Assuming transmission/reception via isotropic antennas
-    loss_ratio = (wavelength / (4 * math.pi * distance)) ** 2
+# Calculate the free space path loss between 2 points
+def free_space_path_loss(x1, y1, x2, y2) -> float:
+    # Transmission at 30GHz (middle of Ka-band) via isotropic antennas
+    loss, _ = link_budget(dist_between_points(x1, y1, x2, y2))
+    return float(loss[0])
+
 
-    return loss_ratio
+# vectorized form of get_error_rate, taking the distance (m) between the
+# sender and receiver instead of their coordinates
+def error_rate_from_distance(distance, high_error):
+    _, error_rate = link_budget(distance, high_error=high_error)
+    return error_rate[0]
 
 
 # Get the rate of transmission error between two satelites
@@ -349,15 +859,10 @@ def get_error_rate(sender, receiver, high_error) -> float:
         and "y" in receiver.keys()
     )
 
-    # Calculate error rate based on FSPL
-    error_rate = free_space_path_loss(sender["x"], sender["y"], receiver["x"], receiver["y"])
-
-    # Check if we're in 'high_error' mode
-    if high_error:
-        # Increase error rate by 10 orders of magnitude, up to 100%
-        error_rate = min(error_rate*(10**10) , 1)
-
-    return error_rate 
+    # Calculate error rate based on FSPL, increased by 10 orders of magnitude
+    # up to 100% in 'high_error' mode
+    distance = dist_between_points(sender["x"], sender["y"], receiver["x"], receiver["y"])
+    return float(error_rate_from_distance(distance, high_error))
 
 
 # for testing
@@ -1,85 +1,415 @@
+import array
+import json
 import math
+import multiprocessing
+import os
 import re
 import sys
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from latency_sketch import LatencySketch, merge_sketches, print_percentiles, save_sketches
+
+# event types of the trace, a parsed event stores the index of its type
+EVENT_TYPES = ["+", "-", "r"]
+EVENT_CODES = {event: code for code, event in enumerate(EVENT_TYPES)}
+
+# columns of a parsed trace, and the dtype each is stored as
+TRACE_COLUMNS = {
+    "type": np.int8,
+    "time": np.float64,
+    "node1": np.int32,
+    "interface": np.int32,
+    "bytes": np.int32,
+    "id": np.int64,
+}
+
+# approximate number of bytes of trace parsed at once
+CHUNK_BYTES = 2**24
+
+# IPv4 ids are reused by packets, so a packet is keyed on its id and the
+# number of times the id has been enqueued: id * KEY_STRIDE + count
+KEY_STRIDE = 2**32
+
+# type, time, node, interface, then the first id and length after them
+TRACE_PATTERN = re.compile(
+    "^([r\\+-]) ([0-9]*\\.?[0-9]*) \\/NodeList\\/([0-9]*)\\/DeviceList\\/([0-9]*)"
+    ".*? id ([^ ]*) .*? length: ([^ ]*) "
+)
+
+
+# parse the lines of a trace into typed column buffers
+# the "id" column holds the raw packet ids, see assign_packet_keys
+def parse_trace_lines(lines):
+    types = array.array("b")
+    times = array.array("d")
+    nodes = array.array("i")
+    interfaces = array.array("i")
+    lengths = array.array("i")
+    ids = array.array("q")
+
+    match = TRACE_PATTERN.match
+    for line in lines:
+        try:
+            type, time, node, interface, id, bytes = match(line).groups()
 
+            # convert everything before appending so a bad line adds nothing
+            row = (EVENT_CODES[type], float(time), int(node), int(interface), int(bytes), int(id))
+            types.append(row[0])
+            times.append(row[1])
+            nodes.append(row[2])
+            interfaces.append(row[3])
+            lengths.append(row[4])
+            ids.append(row[5])
 
-# take trace file and turn it into a dataframe
-def process_trace():
-    file1 = open(sys.argv[1], 'r')
-    Lines = file1.readlines()
-
-    processed_data = []
+        except Exception as e:
+            print("exception encountered")
+            print(line)
+            print(e)
 
+    columns = [types, times, nodes, interfaces, lengths, ids]
+    return {
+        name: np.frombuffer(column, dtype=dtype) if len(column) else np.empty(0, dtype)
+        for (name, dtype), column in zip(TRACE_COLUMNS.items(), columns)
+    }
+
+
+# replace the raw packet ids of parsed columns by packet keys
+# a packet's key is its id plus the number of times the id was enqueued
+# before, counted in trace order. Events of an id that was never enqueued
+# are dropped.
+# ids: number of times each packet id has been enqueued so far, updated in
+#      place so it carries over from one chunk of the trace to the next
+def assign_packet_keys(columns, ids):
+    packet = columns["id"]
+    enqueued = (columns["type"] == EVENT_CODES["+"]).astype(np.int64)
+
+    # group the events by packet id, keeping trace order within an id
+    order = np.argsort(packet, kind="stable")
+    packet_sorted = packet[order]
+    enqueued_sorted = enqueued[order]
+
+    group_start = np.ones(len(packet), dtype=bool)
+    group_start[1:] = packet_sorted[1:] != packet_sorted[:-1]
+    starts = np.flatnonzero(group_start)
+    group = np.cumsum(group_start) - 1
+
+    # enqueues of the id up to and including each event
+    total = np.cumsum(enqueued_sorted)
+    before_group = total[starts] - enqueued_sorted[starts]
+    within = total - before_group[group]
+
+    unique_ids = packet_sorted[starts].tolist()
+    prior = np.array([ids.get(id, -1) for id in unique_ids], dtype=np.int64)
+    count_sorted = prior[group] + within
+
+    # carry the counts over to the next chunk
+    last = prior + np.add.reduceat(enqueued_sorted, starts) if len(starts) else prior
+    for id, count in zip(unique_ids, last.tolist()):
+        if count >= 0:
+            ids[id] = count
+
+    count = np.empty_like(count_sorted)
+    count[order] = count_sorted
+
+    keep = count >= 0
+    if not keep.all():
+        print(f"skipped {np.count_nonzero(~keep)} events of packets never enqueued")
+
+    columns = {name: values[keep] for name, values in columns.items()}
+    columns["id"] = columns["id"] * KEY_STRIDE + count[keep]
+    return columns
+
+
+# stream a trace file, yielding the parsed columns of roughly chunk_bytes of
+# it at a time, so memory does not grow with the length of the trace
+def iter_trace_chunks(path, chunk_bytes=CHUNK_BYTES):
     ids = {}
-    for line in Lines:
-        try:
-            TYPE_INDEX = 1
-            TIME_INDEX = 2
-            NODE_INDEX = 3
-            INTERFACE_INDEX = 4
+    with open(path, "r") as file:
+        while True:
+            lines = file.readlines(chunk_bytes)
+            if not lines:
+                break
+            yield assign_packet_keys(parse_trace_lines(lines), ids)
+
+
+# split a trace file into parts byte ranges which all start at a line
+def split_trace(path, parts):
+    size = os.path.getsize(path)
+    offsets = [0]
+
+    with open(path, "rb") as file:
+        for part in range(1, parts):
+            file.seek(size * part // parts)
+            file.readline()
+            offsets.append(min(file.tell(), size))
+    offsets.append(size)
+
+    return [(start, end) for start, end in zip(offsets, offsets[1:]) if start < end]
+
+
+# parse the lines starting in the byte range [start, end) of a trace file,
+# returns the columns with raw packet ids, see parse_trace_lines
+def parse_trace_range(path, start, end, chunk_bytes=CHUNK_BYTES):
+    chunks = []
+
+    with open(path, "rb") as file:
+        file.seek(start)
+        position = start
+        while position < end:
+            lines = file.readlines(chunk_bytes)
+            if not lines:
+                break
+
+            # drop the lines which start past the end of the range
+            for i, line in enumerate(lines):
+                if position >= end:
+                    lines = lines[:i]
+                    break
+                position += len(line)
+
+            text = b"".join(lines).decode("utf-8", "replace")
+            chunks.append(parse_trace_lines(text.splitlines(True)))
+
+    return concatenate_columns(chunks)
+
+
+# concatenate a list of parsed columns in order
+def concatenate_columns(chunks):
+    return {
+        name: np.concatenate([chunk[name] for chunk in chunks])
+        if chunks
+        else np.empty(0, dtype)
+        for name, dtype in TRACE_COLUMNS.items()
+    }
+
+
+# turn parsed columns into the trace dataframe
+def trace_dataframe(columns):
+    df = pd.DataFrame(columns)
+    df["type"] = pd.Categorical.from_codes(df["type"], EVENT_TYPES)
+    return df
 
-            res = re.compile("^([r\\+-]) ([0-9]*\\.?[0-9]*) \\/NodeList\\/([0-9]*)\\/DeviceList\\/([0-9]*)").search(line)
 
-            type = res.group(TYPE_INDEX)
-            time = res.group(TIME_INDEX)
-            node = res.group(NODE_INDEX)
-            interface = res.group(INTERFACE_INDEX)
+# take trace file and turn it into a dataframe
+# workers: number of processes parsing byte ranges of the trace in parallel.
+#          The packet keys depend on every earlier event of the trace, so they
+#          are assigned once all ranges are parsed and concatenated in order,
+#          giving the same result as a sequential parse
+def process_trace(path=None, workers=1):
+    if path is None:
+        path = sys.argv[1]
+
+    if workers <= 1:
+        return trace_dataframe(concatenate_columns(list(iter_trace_chunks(path))))
+
+    # a few ranges per worker evens out ranges which parse slower
+    ranges = split_trace(path, workers * 4)
+    with multiprocessing.Pool(workers) as pool:
+        chunks = pool.starmap(parse_trace_range, [(path, start, end) for start, end in ranges])
+
+    return trace_dataframe(assign_packet_keys(concatenate_columns(chunks), {}))
+
+
+# the per message table, as csv and as columns
+MESSAGE_STATS_CSV = "data/message_stats.csv"
+MESSAGE_STATS_DIR = "data/message_stats"
+
+# dtypes the message table is stored with, missing nodes are stored as -1
+MESSAGE_COLUMNS = {
+    "node_sending": np.int16,
+    "node_receiving": np.int16,
+    "interface": np.int16,
+    "bytes": np.int32,
+    "id": np.int64,
+}
+
+
+# identifies a version of a file, a cache built from a file is only used
+# while the file still has the same path, size and modification time
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+# store a dataframe as one .npy file per column, so that it can be reloaded
+# memory mapped. Categorical columns are stored as their codes.
+# source: fingerprint of the file the dataframe was built from
+def save_columns(df, directory, source=None):
+    os.makedirs(directory, exist_ok=True)
+    meta_path = os.path.join(directory, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    meta = {"source": source, "columns": []}
+    for name in df.columns:
+        column = df[name]
+        categories = None
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            categories = [str(category) for category in column.cat.categories]
+            values = column.cat.codes.to_numpy()
+        else:
+            values = column.to_numpy()
+        np.save(os.path.join(directory, f"{name}.npy"), values)
+        meta["columns"].append({"name": name, "categories": categories})
+
+    # the metadata is written last, so a directory without it is incomplete
+    with open(meta_path, "w") as file:
+        json.dump(meta, file)
+
+
+# load a dataframe stored by save_columns, memory mapping its columns
+# returns None if there is nothing stored, or if it was built from a
+# different version of the source file
+def load_columns(directory, source=None, mmap=True):
+    try:
+        with open(os.path.join(directory, "meta.json"), "r") as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        return None
 
-            id = re.compile("(?: id )(.*?(?= ))").search(line).group(1)
+    if source is not None and meta["source"] != source:
+        return None
 
-            bytes = re.compile("(?: length: )(.*?(?= ))").search(line).group(1)
+    columns = {}
+    for column in meta["columns"]:
+        values = np.load(
+            os.path.join(directory, f"{column['name']}.npy"),
+            mmap_mode="r" if mmap else None,
+        )
+        if column["categories"] is not None:
+            values = pd.Categorical.from_codes(values, column["categories"])
+        columns[column["name"]] = values
 
-            if id not in ids and type == '+':
-                ids[id] = 0
-            elif id in ids and type == '+':
-                ids[id] += 1
+    return pd.DataFrame(columns, copy=False)
 
-            processed_data.append([type, time, node, interface, bytes, hash(f"{id}t{ids[id]}")])
 
-        except Exception as e:
-            print("exception encountered")
-            print(line)
-            print(e)
+# directory the parsed columns of a trace file are cached in
+def trace_cache_dir(path):
+    return path + ".columns"
 
-    
-    df = pd.DataFrame(processed_data, columns=["type", "time", "node1", "interface", "bytes", "id"])
-    return df
 
+# the parsed trace, from the columnar cache next to the trace if it is up to
+# date, otherwise parsed with workers processes and cached
+def load_trace(path=None, workers=1):
+    if path is None:
+        path = sys.argv[1]
 
-# based off of the trace file create a dataframe where each row is for 1 message id
-# has information on the time queued, time dequeued, time received, sending and receiving nodes
-def create_stats_df():
-    trace_df = process_trace()
-    interface_mapping_df = pd.read_csv("interface_mapping.csv")
+    source = file_fingerprint(path)
+    df = load_columns(trace_cache_dir(path), source)
+    if df is None:
+        df = process_trace(path, workers)
+        save_columns(df, trace_cache_dir(path), source)
+
+    return df
 
-    trace_df["node1"] = pd.to_numeric(trace_df["node1"])
-    trace_df["interface"] = pd.to_numeric(trace_df["interface"])
 
-    df = trace_df.merge(interface_mapping_df, left_on=["node1", "interface"], right_on=["Input Node", "Interface"], how="left")
+# store the message table with small integer columns
+def compact_message_table(df):
+    df = df.copy()
+    for name, dtype in MESSAGE_COLUMNS.items():
+        df[name] = df[name].fillna(-1).astype(dtype)
+    return df
 
-    df["node2"] = df["Output Node"]
-    
-    df = df[["node1", "interface", "node2", "type", "time", "bytes", "id"]]
 
-    df = df.drop_duplicates()
+# the message table, from its columns if they exist, otherwise from the csv
+def load_message_stats():
+    df = load_columns(MESSAGE_STATS_DIR)
+    if df is None:
+        df = pd.read_csv(MESSAGE_STATS_CSV)
+    return df
 
-    # need to merge the df to itself, need to join them together
 
-    df_queue = df[df["type"] == "+"]
-    df_dequeue = df[df["type"] == "-"]
-    df_type = df[df["type"] == "r"]
+# lookup table of the node on the other end of each (node, interface)
+# table[node][interface] is the output node, or -1 if it is not in the mapping
+def interface_lookup(path="interface_mapping.csv"):
+    mapping = pd.read_csv(path)
+    nodes = mapping["Input Node"].to_numpy()
+    interfaces = mapping["Interface"].to_numpy()
+
+    table = np.full((nodes.max() + 1, interfaces.max() + 1), -1, dtype=np.int64)
+    table[nodes, interfaces] = mapping["Output Node"].to_numpy()
+    return table
+
+
+# pair the events of every packet hop in one pass
+# columns: parsed trace columns, see TRACE_COLUMNS
+# table: lookup table from interface_lookup
+# returns one row per enqueue event, in trace order, with the first dequeue and
+# receive event of the same packet key
+def assemble_hops(columns, table):
+    type = np.asarray(columns["type"])
+    time = np.asarray(columns["time"])
+    node = np.asarray(columns["node1"])
+    interface = np.asarray(columns["interface"])
+    length = np.asarray(columns["bytes"])
+    key = np.asarray(columns["id"])
+
+    # sort by key, then type and time, so each key's events sit together with
+    # its enqueues first, then dequeues, then receives, each earliest first
+    order = np.lexsort((length, interface, node, time, type, key))
+    fields = [key[order], type[order], time[order], node[order], interface[order], length[order]]
+
+    # drop events logged twice
+    unique = np.ones(len(order), dtype=bool)
+    if len(order):
+        same = np.ones(len(order) - 1, dtype=bool)
+        for field in fields:
+            same &= field[1:] == field[:-1]
+        unique[1:] = ~same
+    order = order[unique]
+    key_sorted = key[order]
+    type_sorted = type[order]
+
+    # time of the first event of the given type for every key in keys
+    def first_time(event, keys):
+        rows = order[type_sorted == EVENT_CODES[event]]
+        event_keys = key_sorted[type_sorted == EVENT_CODES[event]]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = event_keys[1:] != event_keys[:-1]
+        rows = rows[first]
+        event_keys = event_keys[first]
+
+        result = np.full(len(keys), np.nan)
+        position = np.searchsorted(event_keys, keys)
+        found = position < len(event_keys)
+        found[found] = event_keys[position[found]] == keys[found]
+        result[found] = time[rows[position[found]]]
+        return result
+
+    queued = np.sort(order[type_sorted == EVENT_CODES["+"]])
+    queued_keys = key[queued]
+
+    # the node on the other end of the interface, unknown ones become nan
+    known = (node[queued] < table.shape[0]) & (interface[queued] < table.shape[1])
+    node_receiving = np.full(len(queued), -1, dtype=np.int64)
+    node_receiving[known] = table[node[queued][known], interface[queued][known]]
+
+    return pd.DataFrame(
+        {
+            "node_sending": node[queued],
+            "node_receiving": np.where(node_receiving >= 0, node_receiving, np.nan),
+            "interface": interface[queued],
+            "time_queued": time[queued],
+            "time_dequeued": first_time("-", queued_keys),
+            "time_received": first_time("r", queued_keys),
+            "bytes": length[queued],
+            "id": queued_keys,
+        }
+    )
 
-    df = df_queue.merge(df_dequeue, how="left", on="id")
-    df = df.merge(df_type, how="left", on="id")
 
-    print(df)
+# based off of the trace file create a dataframe where each row is for 1 message id
+# has information on the time queued, time dequeued, time received, sending and receiving nodes
+def create_stats_df(path=None, workers=1):
+    trace_df = load_trace(path, workers)
 
-    df[["node_sending", "node_receiving", "interface", "time_queued", "time_dequeued", "time_received", "bytes", "id"]] = df[["node1_x", "node2_x", "interface_x", "time_x", "time_y", "time", "bytes_x", "id"]]
+    columns = {name: trace_df[name].to_numpy() for name in TRACE_COLUMNS if name != "type"}
+    columns["type"] = trace_df["type"].cat.codes.to_numpy()
 
-    df = df[["node_sending", "node_receiving", "interface", "time_queued", "time_dequeued", "time_received", "bytes", "id"]]
+    df = assemble_hops(columns, interface_lookup())
+
+    print(df)
 
     return df
 
@@ -101,11 +431,36 @@ def expand_dataframe(df):
     return df
 
 
-def calculate_statistics(df):
+# latency sketches of the delay columns, written by get_statistics
+LATENCY_SKETCHES = "data/latency_sketches.json"
+
+# delay columns of the message table which get latency sketches
+DELAY_COLUMNS = ["total_package_time", "time_queued", "total_time"]
+
+
+# drop the warm-up and cool-down of a message table
+def trim_to_window(df):
     min = math.floor(df["time_queued"].min()) + 100
     max = math.ceil(df["time_received"].max()) - 1000
     df = df[df['time_received'] >= min]
     df = df[df['time_received'] <= max]
+    return df
+
+
+# latency sketches of the delay columns of a message table, over the same
+# window as calculate_statistics
+def latency_sketches(df):
+    df = trim_to_window(df)
+    sketches = {}
+    for column in DELAY_COLUMNS:
+        sketches[column] = LatencySketch()
+        sketches[column].add(df[column].to_numpy())
+    return sketches
+
+
+def calculate_statistics(df):
+    sketches = latency_sketches(df)
+    df = trim_to_window(df)
 
     print("Average time from being queued to received")
     print(df["total_package_time"].mean())
@@ -123,6 +478,260 @@ def calculate_statistics(df):
 
     # should be graphed with respect to time
 
+    print("Delay percentiles")
+    print_percentiles(sketches)
+
+    return sketches
+
+
+# times in the trace are divided by this, see TIME_DIVIDER in network_sim.py
+TIME_DIVIDER = 26
+
+# columns summarised by calculate_statistics
+STAT_COLUMNS = ["total_package_time", "time_queued", "total_time", "bytes"]
+
+# enqueued packets not received within this many (trace) seconds are
+# considered lost by OnlineTraceStats and forgotten
+PENDING_TIMEOUT = 1000
+
+
+# count, mean and variance of a stream of values (Welford's algorithm)
+# batches are folded in with the parallel form of the update, so two
+# RunningStats can also be merged. The mean of no values is nan, like the
+# mean of an empty column
+class RunningStats:
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self, count: int = 0, mean: float = float("nan"), m2: float = 0.0) -> None:
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    # fold a batch of values in
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values):
+            mean = values.mean()
+            self.merge(RunningStats(len(values), mean, ((values - mean) ** 2).sum()))
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            return
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else float("nan")
+
+
+# the statistics of calculate_statistics, computed while a trace streams past
+# hops are paired as their events arrive and only hops still in flight are
+# kept. Completed hops are folded into RunningStats per one second bucket of
+# time_received, split into hops received exactly on the second and hops
+# received after it. The warm-up/cool-down window of calculate_statistics
+# needs the whole trace, but its bounds are whole seconds, so once the trace
+# ends it is applied exactly by merging the buckets inside it
+class OnlineTraceStats:
+    def __init__(self) -> None:
+        # hops enqueued but not received yet
+        self.pending = {
+            "id": np.empty(0, np.int64),
+            "node": np.empty(0, np.int32),
+            "time_queued": np.empty(0, np.float64),
+            "time_dequeued": np.empty(0, np.float64),
+            "bytes": np.empty(0, np.int32),
+        }
+        # (second, received exactly on it) -> {column: RunningStats}
+        self.buckets = {}
+        # (second, received exactly on it) -> {column: LatencySketch}
+        self.sketches = {}
+        self.min_time_queued = float("inf")
+        self.max_time_received = float("-inf")
+        self.lost = 0
+
+    # first time of each key in keys among events of the given type
+    @staticmethod
+    def __first_times(columns, event, keys):
+        rows = columns["type"] == EVENT_CODES[event]
+        event_keys = columns["id"][rows]
+        event_times = columns["time"][rows]
+
+        order = np.lexsort((event_times, event_keys))
+        event_keys = event_keys[order]
+        event_times = event_times[order]
+        first = np.ones(len(event_keys), dtype=bool)
+        first[1:] = event_keys[1:] != event_keys[:-1]
+        event_keys = event_keys[first]
+        event_times = event_times[first]
+
+        result = np.full(len(keys), np.nan)
+        position = np.searchsorted(event_keys, keys)
+        found = position < len(event_keys)
+        found[found] = event_keys[position[found]] == keys[found]
+        result[found] = event_times[position[found]]
+        return result
+
+    # fold in one chunk of parsed trace columns, as from iter_trace_chunks
+    def add_chunk(self, columns):
+        queued = columns["type"] == EVENT_CODES["+"]
+        pending = {
+            "id": np.concatenate((self.pending["id"], columns["id"][queued])),
+            "node": np.concatenate((self.pending["node"], columns["node1"][queued])),
+            "time_queued": np.concatenate((self.pending["time_queued"], columns["time"][queued])),
+            "time_dequeued": np.concatenate(
+                (self.pending["time_dequeued"], np.full(np.count_nonzero(queued), np.nan))
+            ),
+            "bytes": np.concatenate((self.pending["bytes"], columns["bytes"][queued])),
+        }
+
+        # dequeues complete the time being queued
+        waiting = np.isnan(pending["time_dequeued"])
+        dequeued = self.__first_times(columns, "-", pending["id"][waiting])
+        pending["time_dequeued"][waiting] = dequeued
+        queue_time = (dequeued - pending["time_queued"][waiting]) * TIME_DIVIDER
+        if np.any(~np.isnan(queue_time)):
+            self.min_time_queued = min(self.min_time_queued, np.nanmin(queue_time))
+
+        # receives complete the hop
+        received = self.__first_times(columns, "r", pending["id"])
+        done = ~np.isnan(received)
+        if np.any(done):
+            self.__add_hops(
+                pending["time_queued"][done],
+                pending["time_dequeued"][done],
+                received[done],
+                pending["bytes"][done],
+            )
+
+        # forget hops which have waited too long to still arrive
+        keep = ~done
+        if len(columns["time"]):
+            stale = pending["time_queued"] < columns["time"].max() - PENDING_TIMEOUT
+            self.lost += np.count_nonzero(keep & stale)
+            keep &= ~stale
+        self.pending = {name: values[keep] for name, values in pending.items()}
+
+    def __add_hops(self, time_queued, time_dequeued, time_received, length):
+        self.max_time_received = max(self.max_time_received, time_received.max())
+
+        values = {
+            "total_package_time": (time_received - time_queued) * TIME_DIVIDER,
+            "time_queued": (time_dequeued - time_queued) * TIME_DIVIDER,
+            "total_time": (time_received - time_dequeued) * TIME_DIVIDER,
+            "bytes": length.astype(np.float64),
+        }
+
+        second = np.floor(time_received)
+        groups, inverse = np.unique(
+            np.stack((second, time_received == second)), axis=1, return_inverse=True
+        )
+        inverse = inverse.ravel()
+        for g in range(groups.shape[1]):
+            bucket = self.buckets.setdefault(
+                (int(groups[0, g]), bool(groups[1, g])),
+                {column: RunningStats() for column in STAT_COLUMNS},
+            )
+            sketches = self.sketches.setdefault(
+                (int(groups[0, g]), bool(groups[1, g])),
+                {column: LatencySketch() for column in DELAY_COLUMNS},
+            )
+            rows = inverse == g
+            for column in STAT_COLUMNS:
+                bucket[column].add(values[column][rows])
+            for column in DELAY_COLUMNS:
+                sketches[column].add(values[column][rows])
+
+    # window of time_received the summary covers, as in calculate_statistics
+    def window(self):
+        return (
+            math.floor(self.min_time_queued) + 100,
+            math.ceil(self.max_time_received) - 1000,
+        )
+
+    # if a bucket lies inside the window
+    def __in_window(self, second, on_second):
+        low, high = self.window()
+        # on_second buckets hold values equal to second, the others hold
+        # values strictly between second and second + 1
+        return low <= second <= high if on_second else low <= second < high
+
+    # RunningStats of every column over the window
+    def summary(self):
+        totals = {column: RunningStats() for column in STAT_COLUMNS}
+
+        for (second, on_second), bucket in self.buckets.items():
+            if self.__in_window(second, on_second):
+                for column in STAT_COLUMNS:
+                    totals[column].merge(bucket[column])
+
+        return totals
+
+    # LatencySketch of every delay column over the window
+    def summary_sketches(self):
+        # every column is listed even if the window is empty
+        empty = {column: LatencySketch() for column in DELAY_COLUMNS}
+        return merge_sketches(
+            [empty]
+            + [sketches for key, sketches in self.sketches.items() if self.__in_window(*key)]
+        )
+
+    # mean of every column per bucket of width seconds of time_received
+    def bucket_means(self, width: int = 1):
+        merged = {}
+        for (second, _), bucket in self.buckets.items():
+            totals = merged.setdefault(
+                second // width * width, {column: RunningStats() for column in STAT_COLUMNS}
+            )
+            for column in STAT_COLUMNS:
+                totals[column].merge(bucket[column])
+
+        rows = [
+            {"time": start, **{column: totals[column].mean for column in STAT_COLUMNS}}
+            for start, totals in sorted(merged.items())
+        ]
+        return pd.DataFrame(rows, columns=["time"] + STAT_COLUMNS)
+
+
+# calculate_statistics in one streaming pass over a trace, without building
+# the message table
+def online_statistics(path=None, chunk_bytes=CHUNK_BYTES):
+    if path is None:
+        path = sys.argv[1]
+
+    stats = OnlineTraceStats()
+    for columns in iter_trace_chunks(path, chunk_bytes):
+        stats.add_chunk(columns)
+
+    totals = stats.summary()
+
+    print("Average time from being queued to received")
+    print(totals["total_package_time"].mean)
+
+    print("Average time being queued")
+    print(totals["time_queued"].mean)
+
+    print("Average message time in transit")
+    print(totals["total_time"].mean)
+
+    print("Average amount of data sent")
+    print(totals["bytes"].mean)
+
+    print("Delay percentiles")
+    sketches = stats.summary_sketches()
+    print_percentiles(sketches)
+    save_sketches(sketches, LATENCY_SKETCHES)
+
+    return stats
+
 
 def graph_stats(df):
     plt.style.use('ggplot')
@@ -158,7 +767,7 @@ def graph_stats(df):
 def get_graphs():
     print("Create graphs")
 
-    df = pd.read_csv("data/message_stats.csv")
+    df = load_message_stats()
     graph_stats(df)
 
 
@@ -166,23 +775,38 @@ def get_statistics():
     print("Calculate statistics")
 
     try:
-        df = pd.read_csv("data/message_stats.csv")
-        calculate_statistics(df)
+        df = load_message_stats()
+        sketches = calculate_statistics(df)
+        save_sketches(sketches, LATENCY_SKETCHES)
     except Exception as e:
         print("ran into error, likely could not find file")
         print(e)
 
 
-def save_dataframe():
+def save_dataframe(path=None, workers=1):
     print("Saving statistical data")
 
-    df = create_stats_df()
-    df = expand_dataframe(df)
+    if path is None:
+        path = sys.argv[1]
+
+    # nothing to do if the message table was already built from this trace
+    source = file_fingerprint(path)
+    if load_columns(MESSAGE_STATS_DIR, source) is not None:
+        return
+
+    df = create_stats_df(path, workers)
+    df = compact_message_table(expand_dataframe(df))
 
-    df.to_csv("data/message_stats.csv")
+    df.to_csv(MESSAGE_STATS_CSV)
+    save_columns(df, MESSAGE_STATS_DIR, source)
 
 
-# for testing
-save_dataframe()
-# get_graphs()
-get_statistics()
+if __name__ == "__main__":
+    # python3 process_data.py <trace> [parsing processes]
+    # python3 process_data.py <trace> --online
+    if "--online" in sys.argv[2:]:
+        online_statistics(sys.argv[1])
+    else:
+        save_dataframe(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 1)
+        # get_graphs()
+        get_statistics()
@@ -0,0 +1,299 @@
+# minimum latency routing over the links of physics_simulation.py
+# every pair of entities with line of sight is a link weighted by its one way
+# light time. All pairs shortest paths are found with a vectorized
+# Floyd-Warshall, keeping the next hop of every path, and cached per time.
+# Every entity moves, so the delay of every link changes between any two
+# times. Paths are kept shortest for reference link delays, which are only
+# moved once a link changes by more than a tolerance, so between full
+# recomputes a table is updated incrementally from the few links that did.
+#
+# usage: python3 routing.py path <source> <destination> <t>
+#        prints the best path and its one way delay at time t (s)
+#        python3 routing.py export <start> <end> <step> <output.csv>
+#        writes the next hop of every router towards every destination, for
+#        every step between start and end
+
+import argparse
+import csv
+from collections import OrderedDict
+
+import numpy as np
+
+import physics_simulation as sim
+
+# a table is updated incrementally if no link used by a path got longer than
+# its reference delay, and fewer than this times the number of entities got
+# shorter. Each shorter link costs O(n^2), a full recompute O(n^3)
+INCREMENTAL_MAX_FRACTION = 0.25
+
+# links whose one way delay (s) is within this of their reference delay keep
+# the reference delay when paths are chosen. The delay reported for a path is
+# always exact, and the path is at most 2 * tolerance per hop slower than the
+# shortest one
+ROUTE_DELAY_TOLERANCE = 1e-3
+
+# one way light time of every link at positions xy, inf between entities
+# without line of sight, 0 from an entity to itself
+def latency_matrix(xy, radius, can_connect):
+    return latency_weights(xy, sim.line_of_sight(xy, radius, can_connect))
+
+
+# latency_matrix for a connected matrix that is already known, e.g. from
+# physics_simulation.get_link_state
+def latency_weights(xy, connected):
+    weights = np.where(connected, sim.transmission_time(sim.distance_matrix(xy)), np.inf)
+    np.fill_diagonal(weights, 0)
+    return weights
+
+
+# all pairs shortest paths of a weight matrix
+# returns the delay of every shortest path (inf if there is none), and the
+# first hop of every path (-1 if there is none, the node itself on the diagonal)
+def all_pairs(weights):
+    n = len(weights)
+    delay = np.array(weights, dtype=np.float64)
+    np.fill_diagonal(delay, 0)
+    next_hop = np.where(np.isfinite(delay), np.arange(n)[None, :], -1)
+
+    # row and column k do not change while paths through k are added, so
+    # every pair is relaxed through k at once
+    for k in range(n):
+        through = delay[:, k, None] + delay[None, k, :]
+        better = through < delay
+        delay = np.where(better, through, delay)
+        next_hop = np.where(better, next_hop[:, k, None], next_hop)
+
+    return delay, next_hop
+
+
+# update shortest paths in place after the edge u -> v got shorter
+def relax_edge(delay, next_hop, u, v, weight):
+    through = delay[:, u, None] + weight + delay[None, v, :]
+    better = through < delay
+    if not better.any():
+        return
+
+    # paths now go to u first, then over the edge
+    first = next_hop[:, u].copy()
+    first[u] = v
+    delay[better] = through[better]
+    next_hop[:] = np.where(better, first[:, None], next_hop)
+
+
+# delay of every path of next_hop under weights, inf where there is no path
+def path_delays(weights, next_hop):
+    n = len(weights)
+    rows, cols = np.indices((n, n))
+    reachable = next_hop >= 0
+    delay = np.where(reachable, 0.0, np.inf)
+
+    # follow every path one hop at a time, a path has at most n - 1 hops
+    current = rows[reachable]
+    target = cols[reachable]
+    total = np.zeros(len(current))
+    for _ in range(n):
+        active = np.flatnonzero(current != target)
+        if len(active) == 0:
+            break
+        hop = next_hop[current[active], target[active]]
+        total[active] += weights[current[active], hop]
+        current[active] = hop
+
+    delay[reachable] = total
+    return delay
+
+
+class RoutingTables:
+    # entities: list of entities, defaults to initial_pos
+    # maxsize: tables kept in memory
+    # delay_tolerance: see ROUTE_DELAY_TOLERANCE, 0 recomputes every table
+    #                  whose links changed at all
+    def __init__(
+        self, entities=None, maxsize: int = 1024, delay_tolerance: float = ROUTE_DELAY_TOLERANCE
+    ) -> None:
+        self.entities = entities
+        self.maxsize = maxsize
+        self.delay_tolerance = delay_tolerance
+        self.tables = OrderedDict()
+        self.full = 0
+        self.incremental = 0
+        self.hits = 0
+
+        # the reference weights the current paths are shortest for, the
+        # delays of the paths under them, and the next hops
+        self.__reference = None
+
+    # (delay, next_hop) of every pair of entities at time t, see all_pairs
+    # the arrays are shared between callers and must be treated as read only
+    def at(self, t):
+        registry = sim.get_registry(self.entities)
+        key = (float(t), registry.hash)
+        if key in self.tables:
+            self.tables.move_to_end(key)
+            self.hits += 1
+            return self.tables[key]
+
+        xy = registry.positions([t])[0]
+        return self.add(key, latency_matrix(xy, registry.radius, registry.can_connect))
+
+    # the (delay, next_hop) table of a weight matrix, cached under key
+    # e.g. Network passes the weights of the links it just applied
+    def add(self, key, weights):
+        table = self.__paths(weights)
+        self.tables[key] = table
+        if len(self.tables) > self.maxsize:
+            self.tables.popitem(last=False)
+        return table
+
+    def __paths(self, weights):
+        if self.__reference is not None and self.__reference[0].shape == weights.shape:
+            table = self.__update(weights)
+            if table is not None:
+                self.incremental += 1
+                return table
+
+        delay, next_hop = all_pairs(weights)
+        self.__reference = (weights, delay, next_hop)
+        self.full += 1
+        return delay, next_hop
+
+    # update the reference paths to weights, None if that needs a full
+    # recompute
+    def __update(self, weights):
+        reference, delay, next_hop = self.__reference
+        n = len(weights)
+
+        with np.errstate(invalid="ignore"):
+            moved = ~(np.abs(weights - reference) <= self.delay_tolerance)
+        moved &= weights != reference
+        shorter = moved & (weights < reference)
+        longer = moved & ~shorter
+
+        # a link is used if it is the first hop of a path from its start
+        used = np.zeros((n, n), dtype=bool)
+        start, end = np.nonzero(next_hop >= 0)
+        used[start, next_hop[start, end]] = True
+        np.fill_diagonal(used, False)
+
+        if (longer & used).any() or shorter.sum() > INCREMENTAL_MAX_FRACTION * n:
+            return None
+
+        # the arrays of earlier tables are shared, so update copies
+        reference = reference.copy()
+        delay = delay.copy()
+        next_hop = next_hop.copy()
+
+        # links no path uses can get longer, or go down, without making any
+        # other path shorter
+        reference[longer] = weights[longer]
+        for u, v in zip(*np.nonzero(shorter)):
+            reference[u, v] = weights[u, v]
+            relax_edge(delay, next_hop, u, v, weights[u, v])
+
+        self.__reference = (reference, delay, next_hop)
+        return path_delays(weights, next_hop), next_hop
+
+    # the tables of every time in times, e.g. every topology update of a run
+    def precompute(self, times):
+        return [self.at(t) for t in times]
+
+    # best path from one entity to another at time t
+    # returns the names of the entities on the path, from source to
+    # destination, and its one way delay (s). The path is empty and the delay
+    # inf if the destination can not be reached
+    def best_path(self, source: str, destination: str, t):
+        registry = sim.get_registry(self.entities)
+        src = registry.names.index(source)
+        dst = registry.names.index(destination)
+        delay, next_hop = self.at(t)
+
+        if not np.isfinite(delay[src, dst]):
+            return [], float("inf")
+
+        path = [src]
+        while path[-1] != dst:
+            path.append(int(next_hop[path[-1], dst]))
+        return [registry.names[i] for i in path], float(delay[src, dst])
+
+
+# tables of the default entities, shared by best_path
+ROUTING = RoutingTables()
+
+
+# best path and its one way delay from one entity to another at time t, e.g.
+# best_path("Earth", "Mars Orbiter", t), see RoutingTables.best_path
+def best_path(source: str, destination: str, t):
+    return ROUTING.best_path(source, destination, t)
+
+
+# the routes of a table as rows of (node, destination, next hop, interface,
+# delay), one per router and reachable destination other than itself
+# interfaces: lookup table of the node on the other end of every interface,
+#             as returned by process_data.interface_lookup. Each hop leaves on
+#             the first interface of the node leading to the next hop, -1 if
+#             there is none
+def route_rows(delay, next_hop, interfaces):
+    rows = []
+    node, destination = np.nonzero(np.isfinite(delay) & ~np.eye(len(delay), dtype=bool))
+    for i, j in zip(node.tolist(), destination.tolist()):
+        hop = int(next_hop[i, j])
+        interface = -1
+        if i < len(interfaces):
+            matches = np.flatnonzero(interfaces[i] == hop)
+            if len(matches):
+                interface = int(matches[0])
+        rows.append((i, j, hop, interface, float(delay[i, j])))
+    return rows
+
+
+# write the routes at every time of times as csv
+def write_routes(routing, times, path, interfaces=None):
+    if interfaces is None:
+        from process_data import interface_lookup
+
+        interfaces = interface_lookup()
+
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["time", "node", "destination", "next_hop", "interface", "delay"])
+        for t in times:
+            delay, next_hop = routing.at(t)
+            for row in route_rows(delay, next_hop, interfaces):
+                writer.writerow((t,) + row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Minimum latency routes between entities")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    path = commands.add_parser("path")
+    path.add_argument("source")
+    path.add_argument("destination")
+    path.add_argument("t", type=float)
+
+    export = commands.add_parser("export")
+    export.add_argument("start", type=float)
+    export.add_argument("end", type=float)
+    export.add_argument("step", type=float)
+    export.add_argument("output")
+    args = parser.parse_args()
+
+    if args.command == "path":
+        names, delay = best_path(args.source, args.destination, args.t)
+        if not names:
+            print(f"{args.destination} can not be reached from {args.source} at t = {args.t}")
+        else:
+            print(" -> ".join(names))
+            print(f"one way delay {delay:.6f} s")
+        return
+
+    times = np.arange(args.start, args.end, args.step)
+    write_routes(ROUTING, times, args.output)
+    print(
+        f"wrote the routes of {len(times)} tables to {args.output}, "
+        f"{ROUTING.full} computed in full and {ROUTING.incremental} incrementally"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# timers and counters for a simulation run
+# a RunProfile adds up the wall clock time and number of calls of every phase
+# of a run, and tracks how fast simulated time advances compared to wall
+# clock time. Timing a phase costs two perf_counter calls, so a profile can
+# stay on for every run.
+#
+# usage: python3 run_profile.py <profile.json> [<profile.json> ...]
+# prints the saved profiles
+
+import json
+import resource
+import sys
+import time
+
+from atomic_file import atomic_write
+
+
+# peak resident set size of this process (bytes)
+def peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RunProfile:
+    # simulation_len: simulated seconds of the run, for the progress line
+    # progress_interval: print a progress line at most once per this many wall
+    #                    clock seconds, None never prints one
+    def __init__(self, simulation_len=None, progress_interval=None) -> None:
+        self.simulation_len = simulation_len
+        self.progress_interval = progress_interval
+
+        # phase -> wall clock seconds, phase -> number of calls
+        self.seconds = {}
+        self.calls = {}
+        # anything else worth keeping, e.g. counts of skipped updates
+        self.counts = {}
+
+        self.sim_time = 0.0
+        self.started = None
+        self.stopped = None
+        self.__last_progress = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.stopped = None
+        self.__last_progress = self.started
+
+    def stop(self):
+        self.stopped = time.perf_counter()
+
+    # wall clock seconds since start
+    def wall_time(self):
+        if self.started is None:
+            return 0.0
+        end = self.stopped if self.stopped is not None else time.perf_counter()
+        return end - self.started
+
+    # add the time of one call of a phase, from a perf_counter start time
+    # returns the current perf_counter, to start timing the next phase
+    def lap(self, phase, since):
+        now = time.perf_counter()
+        self.add(phase, now - since)
+        return now
+
+    def add(self, phase, seconds, calls=1):
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+        self.calls[phase] = self.calls.get(phase, 0) + calls
+
+    # record how far the simulation is, printing a progress line if one is due
+    def advance(self, sim_time):
+        self.sim_time = sim_time
+        if self.progress_interval is None or self.started is None:
+            return
+
+        now = time.perf_counter()
+        if now - self.__last_progress >= self.progress_interval:
+            self.__last_progress = now
+            print(self.progress_line(), flush=True)
+
+    def progress_line(self):
+        wall = self.wall_time()
+        line = f"sim {self.sim_time:.0f} s"
+        if self.simulation_len:
+            line += f"/{self.simulation_len:.0f} s ({100 * self.sim_time / self.simulation_len:.0f}%)"
+        line += f", wall {wall:.1f} s"
+        if wall > 0:
+            line += f", {self.sim_time / wall:.1f}x real time"
+        line += f", peak rss {peak_rss() / 2**20:.0f} MB"
+        return line
+
+    def summary(self):
+        wall = self.wall_time()
+        return {
+            "wall_seconds": wall,
+            "sim_seconds": self.sim_time,
+            "sim_wall_ratio": self.sim_time / wall if wall > 0 else None,
+            "peak_rss_bytes": peak_rss(),
+            "phases": {
+                phase: {
+                    "seconds": seconds,
+                    "calls": self.calls[phase],
+                    "mean_seconds": seconds / self.calls[phase] if self.calls[phase] else None,
+                }
+                for phase, seconds in self.seconds.items()
+            },
+            "counts": dict(self.counts),
+        }
+
+    def save(self, path):
+        with atomic_write(path, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+
+
+# print a profile summary, as returned by RunProfile.summary
+def print_summary(summary):
+    ratio = summary["sim_wall_ratio"]
+    print(
+        f"sim {summary['sim_seconds']:.0f} s in {summary['wall_seconds']:.2f} s wall"
+        f" ({'-' if ratio is None else f'{ratio:.1f}x'} real time),"
+        f" peak rss {summary['peak_rss_bytes'] / 2**20:.0f} MB"
+    )
+
+    wall = summary["wall_seconds"]
+    print(f"  {'phase':<20} {'seconds':>10} {'share':>7} {'calls':>8} {'mean (ms)':>10}")
+    for phase, timing in sorted(summary["phases"].items(), key=lambda item: -item[1]["seconds"]):
+        share = 100 * timing["seconds"] / wall if wall > 0 else 0
+        mean = "-" if timing["mean_seconds"] is None else f"{1000 * timing['mean_seconds']:.3f}"
+        print(
+            f"  {phase:<20} {timing['seconds']:10.3f} {share:6.1f}% {timing['calls']:8d} {mean:>10}"
+        )
+
+    for name, count in summary["counts"].items():
+        print(f"  {name}: {count}")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("usage: python3 run_profile.py <profile.json> [<profile.json> ...]")
+        sys.exit(1)
+
+    for path in sys.argv[1:]:
+        with open(path, "r") as file:
+            print(path)
+            print_summary(json.load(file))
+
+
+if __name__ == "__main__":
+    main()
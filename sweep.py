@@ -0,0 +1,215 @@
+# run a grid of network_sim.py scenarios, each in its own process
+# ns-3's Simulator is a process wide singleton, so a process only ever runs one
+# scenario. Scenarios run concurrently on a pool of fresh worker processes, and
+# every scenario writes its own trace file.
+#
+# usage: python3 sweep.py [--protocols UDP TCP NewReno] [--start-times 10000]
+#                         [--senders Earth] [--receivers Mars] [--time-steps 60]
+#                         [--high-error 1] [--simulation-len 3600]
+#                         [--workers N] [--output sweep] [--timelines]
+#
+# with --timelines the topology of every scenario is precomputed and saved to
+# output, and scenarios which only differ by protocol or end points share it
+
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+
+import physics_simulation as sim
+from process_data import EVENT_CODES, iter_trace_chunks
+
+# columns of the results table
+RESULT_COLUMNS = [
+    "protocol",
+    "start_time",
+    "sender",
+    "receiver",
+    "time_step",
+    "high_error",
+    "trace_file",
+    "sent_bytes",
+    "received_bytes",
+    "success_rate",
+    "wall_seconds",
+    "peak_rss_bytes",
+]
+
+
+# every combination of the given parameters, as a list of scenario dicts
+# each scenario gets a trace file of its own in output_dir
+def scenario_grid(
+    protocols,
+    start_times,
+    senders,
+    receivers,
+    time_steps,
+    high_errors,
+    simulation_len: int = 60 * 60,
+    output_dir: str = "sweep",
+    timelines: bool = False,
+):
+    scenarios = []
+    entities = sim.entities_hash()[:12]
+    grid = itertools.product(protocols, start_times, senders, receivers, time_steps, high_errors)
+
+    for index, (protocol, start, sender, receiver, step, high_error) in enumerate(grid):
+        if sender == receiver:
+            continue
+        name = f"{index:04d}-{protocol}-{start}-{sender}-{receiver}-{step}-{int(high_error)}"
+        scenarios.append(
+            {
+                "protocol": protocol,
+                "start_time": start,
+                "sender": sender,
+                "receiver": receiver,
+                "time_step": step,
+                "high_error": high_error,
+                "simulation_len": simulation_len,
+                "trace_file": os.path.join(output_dir, name.replace(" ", "_") + ".tr"),
+                "timeline_file": os.path.join(
+                    output_dir,
+                    f"timeline-{entities}-{start}-{step}-{int(high_error)}-{simulation_len}.npz",
+                )
+                if timelines
+                else None,
+            }
+        )
+
+    return scenarios
+
+
+# bytes enqueued by the sender node and received by the receiver node, from a
+# trace file. Returns zeros if the trace does not exist
+def trace_totals(trace_file, sender_node, receiver_node):
+    sent = 0
+    received = 0
+    if not os.path.exists(trace_file):
+        return sent, received
+
+    for columns in iter_trace_chunks(trace_file):
+        sending = (columns["type"] == EVENT_CODES["+"]) & (columns["node1"] == sender_node)
+        receiving = (columns["type"] == EVENT_CODES["r"]) & (columns["node1"] == receiver_node)
+        sent += int(columns["bytes"][sending].sum())
+        received += int(columns["bytes"][receiving].sum())
+
+    return sent, received
+
+
+# run one scenario, in a worker process
+# network_sim, and with it ns-3, is only imported here so the parent process
+# never creates a Simulator
+def run_scenario(scenario):
+    import network_sim
+
+    network = network_sim.Network(
+        scenario["start_time"],
+        network_sim.parse_protocol(scenario["protocol"]),
+        scenario["sender"],
+        scenario["receiver"],
+        time_step=scenario["time_step"],
+        simulation_len=scenario["simulation_len"],
+        high_error=scenario["high_error"],
+        trace_file=scenario["trace_file"],
+    )
+
+    timeline = None
+    if scenario.get("timeline_file"):
+        timeline = network_sim.load_or_build_timeline(network, scenario["timeline_file"])
+    network.run(timeline)
+
+    # the end devices are created right after the routers
+    sent, received = trace_totals(
+        scenario["trace_file"], network.num_routers, network.num_routers + 1
+    )
+
+    result = {column: scenario.get(column) for column in RESULT_COLUMNS}
+    result["sent_bytes"] = sent
+    result["received_bytes"] = received
+    result["success_rate"] = 100 * received / sent if sent else None
+
+    # the full profile is next to the trace, see network.profile_file
+    profile = network.profile.summary()
+    result["wall_seconds"] = profile["wall_seconds"]
+    result["peak_rss_bytes"] = profile["peak_rss_bytes"]
+    return result
+
+
+# run every scenario on a pool of worker processes
+# runner: function running one scenario and returning its result dict, it must
+#         be importable by the workers
+# returns the results in the order of the scenarios
+def run_sweep(scenarios, workers: int = None, runner=run_scenario):
+    if not scenarios:
+        return []
+
+    for scenario in scenarios:
+        directory = os.path.dirname(scenario["trace_file"])
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # spawn fresh processes and never reuse them, so each scenario gets its
+    # own ns-3 Simulator
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(min(workers, len(scenarios)), maxtasksperchild=1) as pool:
+        return pool.map(runner, scenarios, chunksize=1)
+
+
+def write_results(results, path):
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=RESULT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+# print the results as a markdown table, like the one in the README
+def print_results(results):
+    print("| Protocol | Start (s) | Sender | Receiver | Step (s) | High Error | Send (bytes) | Receive (bytes) | Success Rate (%) |")
+    print("|---|---|---|---|---|---|---|---|---|")
+    for result in results:
+        rate = result["success_rate"]
+        print(
+            f"| {result['protocol']} | {result['start_time']} | {result['sender']} "
+            f"| {result['receiver']} | {result['time_step']} | {result['high_error']} "
+            f"| {result['sent_bytes']} | {result['received_bytes']} "
+            f"| {'-' if rate is None else f'{rate:.1f}'} |"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a grid of network_sim scenarios")
+    parser.add_argument("--protocols", nargs="+", default=["UDP", "TCP", "NewReno"])
+    parser.add_argument("--start-times", nargs="+", type=int, default=[10000])
+    parser.add_argument("--senders", nargs="+", default=["Earth"])
+    parser.add_argument("--receivers", nargs="+", default=["Mars"])
+    parser.add_argument("--time-steps", nargs="+", type=int, default=[60])
+    parser.add_argument("--high-error", nargs="+", type=int, default=[1])
+    parser.add_argument("--simulation-len", type=int, default=60 * 60)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default="sweep")
+    parser.add_argument("--timelines", action="store_true")
+    args = parser.parse_args()
+
+    scenarios = scenario_grid(
+        args.protocols,
+        args.start_times,
+        args.senders,
+        args.receivers,
+        args.time_steps,
+        [bool(high_error) for high_error in args.high_error],
+        args.simulation_len,
+        args.output,
+        args.timelines,
+    )
+    results = run_sweep(scenarios, args.workers)
+
+    write_results(results, os.path.join(args.output, "results.csv"))
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the modules live at the top of the repository, and ns comes from the stub.
+# Worker processes spawned by sweep.py start with the same sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests", "stub"))
@@ -0,0 +1,10 @@
+# stand-in for the ns-3 python bindings, so network_sim.py and sweep.py can
+# run without ns-3. Every attribute is a mock, the simulator runs no events
+# and writes no trace
+from unittest import mock
+
+ns = mock.MagicMock()
+
+# values network_sim.py does arithmetic on
+ns.core.Simulator.Now.return_value.GetSeconds.return_value = 0.0
+ns.cppyy.gbl.timeline_count.return_value = 0
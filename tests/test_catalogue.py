@@ -0,0 +1,35 @@
+# catalogue.py validation on copies of the default entities
+import copy
+
+import pytest
+
+import catalogue
+import physics_simulation as sim
+
+
+def validation_errors(entities):
+    with pytest.raises(ValueError) as error:
+        catalogue.validate_entities(entities)
+    return str(error.value).splitlines()[1:]
+
+
+def test_default_entities_validate():
+    assert len(catalogue.validate_entities(sim.initial_pos)) == len(sim.initial_pos)
+
+
+def test_field_and_hierarchy_errors_are_reported_together():
+    entities = copy.deepcopy(sim.initial_pos)
+    entities[1]["period"] = "fast"
+    entities[3]["name"] = entities[2]["name"]
+
+    errors = validation_errors(entities)
+    assert any("bad period" in e for e in errors)
+    assert f"duplicate name {entities[2]['name']}" in errors
+    # the invalid row does not shift the positions of the rows after it
+    assert not any("at position" in e for e in errors)
+
+
+def test_rows_that_are_not_objects_are_errors():
+    entities = copy.deepcopy(sim.initial_pos) + [["not", "an", "entity"]]
+    errors = validation_errors(entities)
+    assert errors == [f"entity {len(entities) - 1}: not an object but list"]
@@ -0,0 +1,20 @@
+# link_timeline.py on a short stretch of the default entities
+import pytest
+
+import physics_simulation as sim
+from link_timeline import LinkTimeline
+
+
+def test_bad_queries_raise():
+    timeline = LinkTimeline(10000, 10600)
+    src, dst = sim.initial_pos[0]["id"], sim.initial_pos[1]["id"]
+
+    timeline.connected(src, dst, 10300)
+    with pytest.raises(KeyError):
+        timeline.connected(-1, dst, 10300)
+    with pytest.raises(KeyError):
+        timeline.distance("no such entity", dst, 10300)
+    with pytest.raises(ValueError):
+        timeline.connected(src, dst, 20000)
+    with pytest.raises(ValueError):
+        LinkTimeline(10600, 10000)
@@ -0,0 +1,45 @@
+# network_sim.py against the stub ns module in tests/stub
+import numpy as np
+
+import network_sim
+
+
+def test_build_timeline_after_update(tmp_path):
+    network = network_sim.Network(
+        10000, network_sim.Protocol.UDP, "Earth", "Mars", trace_file=str(tmp_path / "run.tr")
+    )
+    before = network.build_timeline()
+
+    # updates advance network.time, the timeline must still start at the
+    # physics of the start time
+    network.update_topology()
+    network.update_topology()
+    after = network.build_timeline()
+
+    assert before["physics_times"][0] == 10000
+    for name in ("times", "physics_times", "up", "delay", "error"):
+        np.testing.assert_array_equal(after[name], before[name])
+
+
+def test_latency_routes_only_push_changed_next_hops(tmp_path):
+    network = network_sim.Network(
+        10000,
+        network_sim.Protocol.UDP,
+        "Earth",
+        "Mars",
+        trace_file=str(tmp_path / "run.tr"),
+        latency_routes=True,
+    )
+    network.update_topology()
+    first = network.route_counts["routes_applied"]
+    # every router gets a route, or has it removed, towards both end devices
+    assert first == 2 * network.num_routers
+
+    network.update_topology()
+    counts = network.route_counts
+    assert counts["routes_applied"] + counts["routes_skipped"] == 4 * network.num_routers
+    assert counts["routes_applied"] < 2 * first
+    assert counts["route_tables_full"] + counts["route_tables_incremental"] == 2
+
+    receiver = network.entity_name_map["Mars"]
+    assert network.installed_routes[0][receiver] == -1
@@ -0,0 +1,41 @@
+# physics_simulation.py on the default entities
+import numpy as np
+
+import physics_simulation as sim
+
+
+def test_link_state_disk_cache(tmp_path, monkeypatch):
+    cache = sim.StatsCache(path=str(tmp_path))
+    xy, connected = cache.link_state(1000)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    # another process reads the same result back from disk
+    other = sim.StatsCache(path=str(tmp_path))
+    cached_xy, cached_connected = other.link_state(1000)
+    assert (other.hits, other.misses) == (1, 0)
+    np.testing.assert_array_equal(cached_xy, xy)
+    np.testing.assert_array_equal(cached_connected, connected)
+
+    # editing an entity in place changes the key
+    monkeypatch.setitem(sim.initial_pos[4], "period", 9999)
+    edited_xy, _ = other.link_state(1000)
+    assert other.misses == 1
+    assert not np.array_equal(edited_xy[4], xy[4])
+    np.testing.assert_array_equal(edited_xy, sim.get_link_state(1000)[0])
+
+
+def test_link_state_without_path_is_not_cached():
+    cache = sim.StatsCache()
+    xy, _ = cache.link_state(1000)
+    np.testing.assert_array_equal(xy, sim.get_positions([1000])[0])
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_link_budget_dtype_spellings():
+    distance = np.array([[0.0, 1e7], [1e7, 0.0]])
+    expected = sim.link_budget(distance, dtype=np.float32)
+    for dtype in ("float32", np.dtype("float32")):
+        loss, error = sim.link_budget(distance, dtype=dtype)
+        assert loss.dtype == error.dtype == np.float32
+        np.testing.assert_array_equal(loss, expected[0])
+        np.testing.assert_array_equal(error, expected[1])
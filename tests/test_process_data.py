@@ -0,0 +1,20 @@
+# process_data.py on traces from trace_generator.py
+import pandas as pd
+
+import process_data
+import trace_generator
+
+
+def test_parallel_parse_matches_sequential(tmp_path):
+    # several paths interleave the hops of different packets, and drops leave
+    # packets without a receive, so the packet keys depend on the whole trace
+    path = str(tmp_path / "trace.tr")
+    trace_generator.generate_trace(
+        path, 3000, paths=[[1, 2], [1, 0, 2], [1, 3, 2], [1, 4, 5, 2]], drop_rate=0.1, seed=1
+    )
+
+    sequential = process_data.process_trace(path, 1)
+    parallel = process_data.process_trace(path, 4)
+
+    assert len(sequential) > 3000 * 3
+    pd.testing.assert_frame_equal(parallel, sequential)
@@ -0,0 +1,56 @@
+# routing.py on the default entities
+import numpy as np
+
+import physics_simulation as sim
+import routing
+
+# one hour of topology updates at the time step of network_sim.py
+TIMES = np.arange(10000, 10000 + 3600, 60)
+
+
+def weights_at(t):
+    registry = sim.get_registry()
+    xy = registry.positions([t])[0]
+    return routing.latency_matrix(xy, registry.radius, registry.can_connect)
+
+
+def test_incremental_tables_stay_within_tolerance():
+    tolerance = 1e-2
+    tables = routing.RoutingTables(delay_tolerance=tolerance)
+
+    for t in TIMES:
+        delay, next_hop = tables.at(t)
+        weights = weights_at(t)
+        shortest, _ = routing.all_pairs(weights)
+
+        # the delay reported is the delay of the path taken, never shorter
+        # than the shortest path and at most 2 * tolerance per hop longer
+        np.testing.assert_array_equal(np.isfinite(delay), np.isfinite(shortest))
+        np.testing.assert_allclose(delay, routing.path_delays(weights, next_hop))
+        reachable = np.isfinite(shortest)
+        excess = delay[reachable] - shortest[reachable]
+        assert np.all(excess >= -1e-12)
+        assert np.all(excess <= 2 * tolerance * (len(weights) - 1))
+
+    assert tables.incremental > 0
+    assert tables.full + tables.incremental == len(TIMES)
+
+
+def test_zero_tolerance_matches_full_recompute():
+    tables = routing.RoutingTables(delay_tolerance=0)
+    for t in TIMES[:10]:
+        delay, next_hop = tables.at(t)
+        shortest, shortest_hop = routing.all_pairs(weights_at(t))
+        np.testing.assert_array_equal(delay, shortest)
+        np.testing.assert_array_equal(next_hop, shortest_hop)
+
+
+def test_relax_edge_adds_a_shortcut():
+    weights = np.array(
+        [[0, 1, np.inf], [1, 0, 1], [np.inf, 1, 0]], dtype=np.float64
+    )
+    delay, next_hop = routing.all_pairs(weights)
+    assert delay[0, 2] == 2 and next_hop[0, 2] == 1
+
+    routing.relax_edge(delay, next_hop, 0, 2, 0.5)
+    assert delay[0, 2] == 0.5 and next_hop[0, 2] == 2
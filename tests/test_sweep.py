@@ -0,0 +1,74 @@
+# sweep.py end to end against the stub ns module in tests/stub
+import csv
+import json
+import os
+
+import sweep
+import trace_generator
+
+
+def test_scenario_grid_skips_same_end_points(tmp_path):
+    scenarios = sweep.scenario_grid(
+        ["UDP", "TCP"], [10000], ["Earth", "Mars"], ["Mars"], [60], [True],
+        output_dir=str(tmp_path), timelines=True,
+    )
+
+    assert [(s["protocol"], s["sender"]) for s in scenarios] == [("UDP", "Earth"), ("TCP", "Earth")]
+    assert len({s["trace_file"] for s in scenarios}) == 2
+    # scenarios differing only by protocol share a timeline
+    assert len({s["timeline_file"] for s in scenarios}) == 1
+
+
+def test_parse_protocol():
+    import network_sim
+
+    assert network_sim.parse_protocol("UDP") is network_sim.Protocol.UDP
+    assert network_sim.parse_protocol("NewReno") is network_sim.Protocol.NEW_RENO
+    assert network_sim.parse_protocol("QUIC") is None
+
+
+def test_run_sweep_one_worker(tmp_path):
+    scenarios = sweep.scenario_grid(
+        ["UDP"], [10000], ["Earth"], ["Mars"], [600], [True],
+        simulation_len=3600, output_dir=str(tmp_path), timelines=True,
+    )
+    results = sweep.run_sweep(scenarios, workers=1)
+
+    assert len(results) == 1
+    result = results[0]
+    assert list(result) == sweep.RESULT_COLUMNS
+    assert result["protocol"] == "UDP"
+    # the stub simulator writes no trace
+    assert result["sent_bytes"] == 0 and result["success_rate"] is None
+    assert result["wall_seconds"] > 0
+
+    assert os.path.exists(scenarios[0]["timeline_file"])
+    profile_file = os.path.splitext(scenarios[0]["trace_file"])[0] + ".profile.json"
+    with open(profile_file, "r") as file:
+        assert "build_timeline" in json.load(file)["phases"]
+
+    path = os.path.join(tmp_path, "results.csv")
+    sweep.write_results(results, path)
+    with open(path, "r", newline="") as file:
+        assert [row["protocol"] for row in csv.DictReader(file)] == ["UDP"]
+
+
+def test_trace_totals_counts_sender_and_receiver_bytes(tmp_path):
+    # every packet is enqueued once by node 1 and received by node 2 unless
+    # it is dropped on one of the two hops
+    packets = 300
+    size = trace_generator.PAYLOAD_SIZE + trace_generator.UDP_HEADER + trace_generator.IPV4_HEADER
+    lossless = str(tmp_path / "lossless.tr")
+    lossy = str(tmp_path / "lossy.tr")
+    trace_generator.generate_trace(lossless, packets, paths=[[1, 2]])
+    trace_generator.generate_trace(lossy, packets, paths=[[1, 0, 2]], drop_rate=0.2, seed=3)
+
+    assert sweep.trace_totals(lossless, 1, 2) == (packets * size, packets * size)
+
+    with open(lossy, "r") as file:
+        delivered = sum(line.startswith("r ") and "/NodeList/2/" in line for line in file)
+    assert 0 < delivered < packets
+    assert sweep.trace_totals(lossy, 1, 2) == (packets * size, delivered * size)
+    # the end points are taken from the arguments, node 0 only relays
+    assert sweep.trace_totals(lossy, 0, 2)[0] < packets * size
+    assert sweep.trace_totals(str(tmp_path / "missing.tr"), 1, 2) == (0, 0)
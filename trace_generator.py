@@ -0,0 +1,285 @@
+# generate synthetic ns-3 ascii traces, to load test process_data.py without
+# running ns-3
+# packets are sent at a constant rate along paths of routers. Every hop is
+# logged like a PointToPointNetDevice does: an enqueue and dequeue on the
+# sending device, then a receive on the device at the other end, chosen to be
+# consistent with interface_mapping.csv. A packet dropped on a hop is enqueued
+# and dequeued but never received, and goes no further.
+#
+# usage: python3 trace_generator.py <output> [--duration 3600] [--rate 122]
+#                                   [--path 1 0 2] [--path 1 2] [--delay 0.01]
+#                                   [--data-rate 1000000] [--drop-rate 0]
+#                                   [--seed 0] [--workers 1]
+# every --path adds a path of node ids, packets pick one of them at random
+
+import argparse
+import functools
+import multiprocessing
+
+import numpy as np
+
+from process_data import EVENT_CODES, interface_lookup
+
+# ns-3 writes times with the default precision of a c++ stream
+TIME_FORMAT = "%.6g"
+
+# bytes of headers added to the payload: IPv4 (20) and UDP (8)
+IPV4_HEADER = 20
+UDP_HEADER = 8
+
+# payload of the OnOffApplication in network_sim.py (bytes)
+PAYLOAD_SIZE = 1024
+
+# 1Mbps OnOffApplication with 1024 byte packets (packets/s)
+DEFAULT_RATE = 1000000 / 8 / PAYLOAD_SIZE
+
+# channel delay and data rate of the links between routers in network_sim.py
+DEFAULT_DELAY = 0.01
+DEFAULT_DATA_RATE = 1000000
+
+# from Earth to Mars
+DEFAULT_PATHS = [[1, 2]]
+
+INITIAL_TTL = 64
+
+# packets generated at once, bounds memory on long traces
+BLOCK_PACKETS = 2**16
+
+# rank of every event type code within a hop
+CAUSAL_ORDER = np.empty(len(EVENT_CODES), dtype=np.int64)
+CAUSAL_ORDER[[EVENT_CODES[event] for event in ("+", "-", "r")]] = np.arange(3)
+
+
+# the device a node uses to reach each next node of a path
+# returns the sending devices and the receiving devices of every hop
+# table: lookup table from interface_lookup
+# raises ValueError for a node or hop missing from interface_mapping.csv
+def path_devices(path, table):
+    sending = []
+    receiving = []
+    for node, next_node in zip(path[:-1], path[1:]):
+        if max(node, next_node) >= len(table):
+            raise ValueError(f"node {max(node, next_node)} is not in interface_mapping.csv")
+        out = np.flatnonzero(table[node] == next_node)
+        back = np.flatnonzero(table[next_node] == node)
+        if not len(out) or not len(back):
+            raise ValueError(f"no link from node {node} to node {next_node}")
+        sending.append(out[0])
+        receiving.append(back[0])
+    return np.array(sending), np.array(receiving)
+
+
+# the line templates of every event type, taking time, node, device, ttl, id
+def line_templates(payload_size, source="10.0.0.1", destination="10.0.1.2"):
+    length = payload_size + UDP_HEADER + IPV4_HEADER
+    ipv4 = (
+        f"ns3::Ipv4Header (tos 0x0 DSCP Default ECN Not-ECT ttl %d id %d protocol 17 "
+        f"offset (bytes) 0 flags [none] length: {length} {source} > {destination}) "
+        f"ns3::UdpHeader (length: {length - IPV4_HEADER} 49153 > 9) "
+        f"Payload (size={payload_size})\n"
+    )
+    ppp = "ns3::PppHeader (Point-to-Point Protocol: IP (0x0021)) "
+    device = f"{TIME_FORMAT} /NodeList/%d/DeviceList/%d/$ns3::PointToPointNetDevice"
+
+    templates = [None] * len(EVENT_CODES)
+    templates[EVENT_CODES["+"]] = f"+ {device}/TxQueue/Enqueue {ppp}{ipv4}"
+    templates[EVENT_CODES["-"]] = f"- {device}/TxQueue/Dequeue {ppp}{ipv4}"
+    templates[EVENT_CODES["r"]] = f"r {device}/MacRx {ipv4}"
+    return templates
+
+
+# the events of the given packets, all following the same path
+# packet: array of packet numbers, packet k is sent at k / rate
+# returns a dict of event columns, in no particular order
+def path_events(packet, rate, path, devices, delay, data_rate, drop_rate, payload_size, rng):
+    sending, receiving = devices
+    hops = len(path) - 1
+    count = len(packet)
+
+    # each hop queues nothing, so the dequeue is immediate and the packet
+    # arrives after the serialization and channel delay. Every hop is
+    # enqueued at the exact time the previous one was received, computing
+    # them separately rounds some receives after the next enqueue
+    length = payload_size + UDP_HEADER + IPV4_HEADER
+    hop_time = length * 8 / data_rate + delay
+    arrival = np.full((count, hops + 1), hop_time)
+    arrival[:, 0] = packet / rate
+    np.cumsum(arrival, axis=1, out=arrival)
+    enqueue = arrival[:, :-1]
+    received = arrival[:, 1:]
+
+    # a packet makes every hop up to and including the first it is dropped on
+    dropped = rng.random((count, hops)) < drop_rate
+    reached = np.ones((count, hops), dtype=bool)
+    reached[:, 1:] = np.cumsum(dropped, axis=1)[:, :-1] == 0
+    arrived = reached & ~dropped
+
+    hop = np.broadcast_to(np.arange(hops), (count, hops))
+    packet = np.broadcast_to(packet[:, None], (count, hops))
+    node = np.broadcast_to(np.array(path[:-1]), (count, hops))
+    next_node = np.broadcast_to(np.array(path[1:]), (count, hops))
+    out = np.broadcast_to(sending, (count, hops))
+    back = np.broadcast_to(receiving, (count, hops))
+
+    events = []
+    for event, mask, time, at, device in (
+        ("+", reached, enqueue, node, out),
+        ("-", reached, enqueue, node, out),
+        ("r", arrived, received, next_node, back),
+    ):
+        events.append(
+            {
+                "type": np.full(np.count_nonzero(mask), EVENT_CODES[event], dtype=np.int8),
+                "time": time[mask],
+                "node": at[mask],
+                "device": device[mask],
+                "ttl": INITIAL_TTL - hop[mask],
+                "packet": packet[mask],
+                "hop": hop[mask],
+            }
+        )
+
+    return {name: np.concatenate([e[name] for e in events]) for name in events[0]}
+
+
+# the events of every packet in time order, one block at a time
+# see generate_trace for the parameters
+def event_blocks(packets, rate, paths, delay, data_rate, drop_rate, payload_size, seed):
+    rng = np.random.default_rng(seed)
+    table = interface_lookup()
+    devices = [path_devices(p, table) for p in paths]
+
+    carry = None
+    for first in range(0, packets, BLOCK_PACKETS):
+        count = min(BLOCK_PACKETS, packets - first)
+        choice = rng.integers(0, len(paths), count)
+
+        # every path is generated on its own, then the block is merged
+        blocks = [] if carry is None else [carry]
+        for p, (route, route_devices) in enumerate(zip(paths, devices)):
+            chosen = first + np.flatnonzero(choice == p)
+            if len(chosen):
+                blocks.append(
+                    path_events(
+                        chosen, rate, route, route_devices, delay, data_rate,
+                        drop_rate, payload_size, rng,
+                    )
+                )
+
+        events = {name: np.concatenate([b[name] for b in blocks]) for name in blocks[0]}
+        order = np.lexsort((events["type"], events["hop"], events["packet"], events["time"]))
+        events = {name: values[order] for name, values in events.items()}
+
+        # later packets are sent after this block, so every event before then
+        # is final. The rest waits for the next block
+        if first + count < packets:
+            ready = np.searchsorted(events["time"], (first + count) / rate)
+        else:
+            ready = len(events["time"])
+        carry = {name: values[ready:] for name, values in events.items()}
+
+        block = {name: values[:ready] for name, values in events.items()}
+        check_causal(block)
+        yield block
+
+
+# assert that the events of every packet are in causal order: hop after hop,
+# each enqueued, dequeued then received. An event is only held back for a
+# later block if every later event of its packet is too, so checking each
+# block covers the whole trace
+def check_causal(events):
+    order = np.argsort(events["packet"], kind="stable")
+    packet = events["packet"][order]
+    stage = (events["hop"] * len(EVENT_CODES) + CAUSAL_ORDER[events["type"]])[order]
+    same = packet[1:] == packet[:-1]
+    assert not np.any(same & (stage[1:] < stage[:-1])), "events of a packet out of order"
+
+
+# the lines of a block of events, as one string
+def format_events(events, templates):
+    types = events["type"].tolist()
+    rows = zip(
+        events["time"].tolist(),
+        events["node"].tolist(),
+        events["device"].tolist(),
+        events["ttl"].tolist(),
+        (events["packet"] % 65536).tolist(),
+    )
+    return "".join([templates[e] % row for e, row in zip(types, rows)])
+
+
+# write a trace of the given number of packets
+# rate: packets sent per second
+# paths: list of paths, each a list of node ids, packets pick one at random
+# delay: channel delay of every hop (s)
+# data_rate: data rate of every link (bits/s)
+# drop_rate: chance a packet is dropped on each hop
+# workers: processes formatting blocks of lines in parallel, formatting is
+#          what limits the speed of a single process
+# returns the number of lines written
+def generate_trace(
+    path,
+    packets,
+    rate=DEFAULT_RATE,
+    paths=None,
+    delay=DEFAULT_DELAY,
+    data_rate=DEFAULT_DATA_RATE,
+    drop_rate=0.0,
+    payload_size=PAYLOAD_SIZE,
+    seed=0,
+    workers=1,
+):
+    if paths is None:
+        paths = DEFAULT_PATHS
+
+    blocks = event_blocks(packets, rate, paths, delay, data_rate, drop_rate, payload_size, seed)
+    format_block = functools.partial(format_events, templates=line_templates(payload_size))
+
+    lines = 0
+    with open(path, "w", buffering=2**22) as file:
+        if workers <= 1:
+            texts = map(format_block, blocks)
+        else:
+            pool = multiprocessing.Pool(workers)
+            texts = pool.imap(format_block, blocks)
+
+        for text in texts:
+            file.write(text)
+            lines += text.count("\n")
+
+        if workers > 1:
+            pool.close()
+            pool.join()
+
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic ns-3 ascii trace")
+    parser.add_argument("output")
+    parser.add_argument("--duration", type=float, default=3600)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE)
+    parser.add_argument("--path", nargs="+", type=int, action="append", dest="paths")
+    parser.add_argument("--delay", type=float, default=DEFAULT_DELAY)
+    parser.add_argument("--data-rate", type=float, default=DEFAULT_DATA_RATE)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    lines = generate_trace(
+        args.output,
+        int(args.duration * args.rate),
+        args.rate,
+        args.paths,
+        args.delay,
+        args.data_rate,
+        args.drop_rate,
+        seed=args.seed,
+        workers=args.workers,
+    )
+    print(f"wrote {lines} lines to {args.output}")
+
+
+if __name__ == "__main__":
+    main()